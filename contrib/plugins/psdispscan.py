@@ -31,6 +31,7 @@ This module implements the slow thorough process scanning
 
 #pylint: disable-msg=C0111
 
+import re
 import volatility.commands as commands
 import volatility.cache as cache
 import volatility.utils as utils
@@ -62,6 +63,10 @@ class DispatchHeaderCheck(scan.ScannerCheck):
         data = self.address_space.read(offset + self.type.obj_offset, self.buffer_size)
         return data[self.type.obj_offset] == "\x03" and data[self.size.obj_offset] == "\x1b"
 
+    def prefilter(self):
+        return re.compile("(?=.{{{0}}}\x03)(?=.{{{1}}}\x1b)".format(
+            self.type.obj_offset, self.size.obj_offset), re.DOTALL)
+
     def skip(self, data, offset):
         try:
             nextval = data.index("\x03", offset + 1)
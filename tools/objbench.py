@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Measures the memory and time cost of volatility objects.
+
+By default a handle table walk is simulated: for every entry the
+_HANDLE_TABLE_ENTRY, its object pointer, the _OBJECT_HEADER behind it
+and a few native members are instantiated and kept, as plugins which
+collect their results before rendering do.  The peak RSS of the
+process and the memory used per entry are then reported.
+
+With -f and -p a real plugin is run against an image instead, and
+only the peak RSS and run time are reported.  Run the script against
+two trees to compare them.
+
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+from optparse import OptionParser
+import os, resource, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.debug as debug
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+import volatility.obj as obj
+
+def peak_rss():
+    """Returns the peak resident set size in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def make_config(profile, location = None):
+    debug.setup()
+    registry.PluginImporter()
+    config = conf.ConfObject()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+    if location:
+        config.update("location", "file://" + location)
+    config.PROFILE = profile
+    return config
+
+def simulate(config, count):
+    space = addrspace.BufferAddressSpace(config, data = "\x00" * 0x10000)
+    entry_size = space.profile.get_obj_size("_HANDLE_TABLE_ENTRY")
+    slots = 0x8000 / entry_size
+
+    results = []
+    start = time.time()
+    for i in range(count):
+        entry = obj.Object("_HANDLE_TABLE_ENTRY", offset = (i % slots) * entry_size, vm = space)
+        header = obj.Object("_OBJECT_HEADER", offset = 0x8000, vm = space, parent = entry)
+        results.append((entry, entry.m("Object"), entry.GrantedAccess, header,
+                        header.PointerCount, header.Type))
+    return time.time() - start
+
+def run_plugin(config, name):
+    plugins = registry.get_plugin_classes(commands.Command, lower = True)
+    plugin = plugins[name.lower()](config)
+    start = time.time()
+    with open(os.devnull, "w") as outfd:
+        plugin.render_text(outfd, plugin.calculate())
+    return time.time() - start
+
+def main():
+    parser = OptionParser(usage = "%prog [options]")
+    parser.add_option("-n", "--count", type = "int", default = 100000,
+                      help = "Number of handle table entries to simulate")
+    parser.add_option("-f", "--filename", default = None,
+                      help = "Image to run a plugin against")
+    parser.add_option("-p", "--plugin", default = "handles",
+                      help = "Plugin to run with -f")
+    parser.add_option("--profile", default = "WinXPSP2x86",
+                      help = "Profile to use")
+    (opts, _args) = parser.parse_args()
+
+    ## Keep our options away from the volatility option parser
+    del sys.argv[1:]
+
+    config = make_config(opts.profile, opts.filename)
+    before = peak_rss()
+
+    if opts.filename:
+        elapsed = run_plugin(config, opts.plugin)
+        print "{0}: {1:.2f}s".format(opts.plugin, elapsed)
+    else:
+        elapsed = simulate(config, opts.count)
+        print "{0} entries: {1:.2f}s, {2:.0f} entries/s, {3:.0f} bytes per entry".format(
+            opts.count, elapsed, opts.count / max(elapsed, 1e-9),
+            (peak_rss() - before) * 1024 * 1024 / opts.count)
+
+    after = peak_rss()
+    print "peak RSS {0:.1f} MB ({1:.1f} MB before the run)".format(after, before)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Regression checks for the scanning and object layers.
+
+Everything runs against small buffers built in memory, so no memory
+image is needed.  Run the script directly (add -v for the name of each
+check), or name the checks to run as with any unittest program.
+
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+import os, struct, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.debug as debug
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+import volatility.obj as obj
+import volatility.scan as scan
+import volatility.constants as constants
+
+config = None
+
+def setup():
+    global config
+    if config is not None:
+        return
+    debug.setup()
+    registry.PluginImporter()
+    config = conf.ConfObject()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+
+def buffer_space(profile, data):
+    """Returns a BufferAddressSpace holding data, using the named profile"""
+    config.PROFILE = profile
+    return addrspace.BufferAddressSpace(config, data = data)
+
+class PoolTypeTest(unittest.TestCase):
+    """CheckPoolType must agree with the profile's _POOL_HEADER"""
+
+    profiles = ["WinXPSP2x86", "Win7SP1x86", "Win7SP1x64"]
+
+    def runTest(self):
+        import volatility.plugins.common as common
+
+        for profile in self.profiles:
+            space = buffer_space(profile, "\x00" * 0x100)
+            layout = common.CheckPoolType(space, free = True)
+            checks = [(common.CheckPoolType(space, paged = paged, non_paged = non_paged, free = free),
+                       paged, non_paged, free)
+                      for paged in (False, True)
+                      for non_paged in (False, True)
+                      for free in (False, True)]
+
+            for value in range(1 << (layout.mask >> layout.start_bit).bit_length()):
+                data = bytearray(0x100)
+                layout.unpacker.pack_into(data, layout.header_offset, value << layout.start_bit)
+                space.assign_buffer(str(data))
+                pool_hdr = obj.Object("_POOL_HEADER", offset = 0, vm = space)
+                self.assertEqual(pool_hdr.PoolType.v(), value)
+
+                for check, paged, non_paged, free in checks:
+                    expected = bool((non_paged and pool_hdr.NonPagedPool) or
+                                    (free and pool_hdr.FreePool) or
+                                    (paged and pool_hdr.PagedPool))
+                    self.assertEqual(check.test(value), expected,
+                                     "{0} PoolType {1} paged={2} non_paged={3} free={4}".format(
+                                     profile, value, paged, non_paged, free))
+
+        ## The parity is reversed from Vista onwards
+        self.assertTrue(common.CheckPoolType(buffer_space("Win7SP1x86", ""), non_paged = True).test(2))
+        self.assertFalse(common.CheckPoolType(buffer_space("Win7SP1x86", ""), non_paged = True).test(1))
+        self.assertTrue(common.CheckPoolType(buffer_space("WinXPSP2x86", ""), non_paged = True).test(1))
+
+class PagedBufferSpace(addrspace.AbstractVirtualAddressSpace):
+    """An identity mapped view of a BufferAddressSpace.
+
+    Like the paging address spaces it takes a dtb, so process address
+    spaces can be built from objects which live in it.
+    """
+
+    def __init__(self, base, config, dtb = None, **kwargs):
+        self.as_assert(isinstance(base, addrspace.BufferAddressSpace), "Not stacking on a buffer")
+        ## Keep out of the voting in utils.load_as
+        self.as_assert(dtb is not None, "No dtb given")
+        addrspace.AbstractVirtualAddressSpace.__init__(self, base, config, **kwargs)
+        self.dtb = dtb
+
+    def vtop(self, vaddr):
+        return vaddr
+
+    def is_valid_address(self, addr):
+        return self.base.is_valid_address(addr)
+
+    def read(self, addr, length):
+        return self.base.read(addr, length)
+
+    def zread(self, addr, length):
+        return self.base.zread(addr, length)
+
+    def get_available_addresses(self):
+        return self.base.get_available_addresses()
+
+class SnapshotSessionTest(unittest.TestCase):
+    """A snapshot of an _EPROCESS can still build its process address space"""
+
+    def runTest(self):
+        space = buffer_space("WinXPSP2x86", "")
+        profile = space.profile
+        data = bytearray(0x2000)
+        struct.pack_into("<I", data, profile.get_obj_offset("_EPROCESS", "Session"), 0x1000)
+        struct.pack_into("<I", data, profile.get_obj_offset("_KPROCESS", "DirectoryTableBase"), 0x39000)
+        struct.pack_into("<I", data, 0x1000 + profile.get_obj_offset("_MM_SESSION_SPACE", "SessionId"), 3)
+        space.assign_buffer(str(data))
+        kernel_space = PagedBufferSpace(space, config, dtb = 0x39000)
+
+        task = obj.Object("_EPROCESS", offset = 0, vm = kernel_space)
+        snapshot = task.snapshot()
+        self.assertTrue(isinstance(snapshot.obj_vm, obj.SnapshotVM))
+        self.assertEqual(task.SessionId, 3)
+        self.assertEqual(snapshot.SessionId, 3)
+        self.assertTrue(isinstance(snapshot.get_process_address_space(), PagedBufferSpace))
+
+class BoundaryTest(unittest.TestCase):
+    """Hits whose checks read across a block boundary are found"""
+
+    block_size = 0x10000
+
+    def setUp(self):
+        self.saved_block_size = constants.SCAN_BLOCKSIZE
+        constants.SCAN_BLOCKSIZE = self.block_size
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE = self.saved_block_size
+
+    def runTest(self):
+        import volatility.plugins.common as common
+        import volatility.plugins.kdbgscan as kdbgscan
+
+        class TestPoolScanner(scan.PoolScanner):
+            checks = [("PoolTagCheck", dict(tag = "Tst1")),
+                      ("CheckPoolSize", dict(condition = lambda x: x == 8))]
+
+        space = buffer_space("WinXPSP2x86", "")
+        data = bytearray(3 * self.block_size)
+
+        ## A KDBG header whose prefix ends at the first boundary
+        header = "\x00\xf8\xff\xffKDBG\x90\x02"
+        kdbg = self.block_size - 4
+        data[kdbg:kdbg + len(header)] = header
+
+        ## A BlockSize which straddles the second boundary
+        size_check = common.CheckPoolSize(space)
+        tag = 2 * self.block_size + 1
+        data[tag:tag + 4] = "Tst1"
+        size_check.unpacker.pack_into(data, tag + size_check.field_offset,
+                                      (8 / size_check.pool_alignment) << size_check.start_bit)
+
+        space.assign_buffer(str(data))
+        kernel_space = PagedBufferSpace(space, config, dtb = 0)
+
+        kdbg_hits = [kdbg + 4 - 0x10]
+        pool_hits = [tag - space.profile.get_obj_offset("_POOL_HEADER", "PoolTag")]
+
+        self.assertEqual(list(kdbgscan.KDBGScanner(needles = [header]).scan(kernel_space)), kdbg_hits)
+        self.assertEqual(list(TestPoolScanner().scan(kernel_space)), pool_hits)
+
+        kdbg_scanner = kdbgscan.KDBGScanner(needles = [header])
+        pool_scanner = TestPoolScanner()
+        hits = list(scan.MultiScanner([kdbg_scanner, pool_scanner]).scan(kernel_space))
+        self.assertEqual([o for s, o in hits if s is kdbg_scanner], kdbg_hits)
+        self.assertEqual([o for s, o in hits if s is pool_scanner], pool_hits)
+
+        ## The MultiScanner would skip whatever a scanner does in scan
+        import volatility.plugins.kpcrscan as kpcrscan
+        self.assertRaises(ValueError, scan.MultiScanner, [kpcrscan.KPCRScanner()])
+
+class MultiScanCommandsTest(unittest.TestCase):
+    """Only commands which opt in themselves are run by multiscan"""
+
+    def runTest(self):
+        import volatility.plugins.multiscan as multiscan
+
+        names = multiscan.scan_commands()
+        for name in ["filescan", "driverscan", "mutantscan", "psscan", "connscan", "sockscan"]:
+            self.assertTrue(name in names, name)
+        ## These derive from scan commands but render something else
+        for name in ["devicetree", "driverirp", "wndscan"]:
+            self.assertFalse(name in names, name)
+
+        ## Listing the commands does not register their options
+        multiscan.MultiScan(config)
+        self.assertFalse("silent" in config.options)
+
+class ProfileDetectorTest(unittest.TestCase):
+    """A profile whose address space can not be stacked is skipped"""
+
+    def runTest(self):
+        import volatility.plugins.imageinfo as imageinfo
+
+        space = buffer_space("WinXPSP2x86", "\x00" * 0x10000)
+
+        ## Bypass __init__, which loads the image from the config
+        detector = imageinfo.ProfileDetector.__new__(imageinfo.ProfileDetector)
+        detector._config = config
+        detector.physical = space
+        ## Zeroed page tables map nothing, so the paging address
+        ## spaces fail their checks
+        detector.dtbs = {"WinXPSP2x86": 0x1000}
+        detector.matches = {}
+
+        origdtb = config.DTB
+        match = detector.evaluate("WinXPSP2x86", 0x1000, ["WinXPSP2x86"])
+        self.assertEqual(match.passed, ["KDBG header", "DTB"])
+        self.assertEqual(match.addr_space, None)
+        self.assertEqual(config.DTB, origdtb)
+
+class HiberRangesTest(unittest.TestCase):
+    """Pages listed by several hibernation tables come from the last one"""
+
+    def runTest(self):
+        import volatility.plugins.addrspaces.hibernate as hibernate
+
+        ## (start page, end page, table, index in table) in file order
+        listed = [(10, 20, 0, 0), (30, 40, 0, 10), (15, 35, 1, 0),
+                  (0, 12, 2, 0), (36, 38, 2, 12), (50, 60, 2, 14)]
+
+        ## Bypass __init__, which reads the tables from a file
+        space = hibernate.WindowsHiberFileSpace32.__new__(hibernate.WindowsHiberFileSpace32)
+        space.Ranges = []
+        space.RangeStarts = []
+        expected = {}
+        for r in listed:
+            space._add_range(r)
+            start, end, table, index = r
+            for page in range(start, end):
+                expected[page] = (table, index + page - start)
+
+        found = {}
+        for start, end, table, index in space.Ranges:
+            for page in range(start, end):
+                self.assertFalse(page in found, page)
+                found[page] = (table, index + page - start)
+        self.assertEqual(found, expected)
+        self.assertEqual(space.Ranges, sorted(space.Ranges))
+        self.assertEqual(space.RangeStarts, [r[0] for r in space.Ranges])
+
+        ## Each page is found in the block of its table holding it
+        space.Tables = [(0, 20), (0, 20), (0, 24)]
+        space.index_table_ranges()
+        space._get_block = lambda table, block: (table * 0x1000 + block, 0x100)
+        space.PageDict = {}
+        space.LookupCache = {}
+        for page, (table, index) in expected.items():
+            self.assertEqual(space._locate_page(page),
+                             (table * 0x1000 + index / 0x10, 0x100, index % 0x10))
+
+class UnreadableTest(unittest.TestCase):
+    """Blocks which zread had to pad are counted once, without reading again"""
+
+    def runTest(self):
+        space = buffer_space("WinXPSP2x86", "A" * 0x1000 + "\x00" * 0x1000)
+        padded = space.data + "\x00" * 0x2000
+
+        self.assertFalse(scan.unreadable_pages(space, 0, padded[:0x2000]))
+        self.assertTrue(scan.unreadable_pages(space, 0, padded))
+
+        reads = []
+        class CountingSpace(PagedBufferSpace):
+            def zread(self, addr, length):
+                reads.append((addr, length))
+                return padded[addr:addr + length]
+
+        stats = scan.ScanStats()
+        saved = scan.config.SCAN_STATS
+        scan.config.update("SCAN_STATS", True)
+        try:
+            blocks = list(scan.read_range(CountingSpace(space, config, dtb = 0), 0, 0x4000, 0x4000, stats = stats))
+        finally:
+            scan.config.update("SCAN_STATS", saved)
+
+        self.assertEqual([(b[0], b[1]) for b in blocks], [(0, padded)])
+        self.assertEqual(reads, [(0, 0x4000)])
+        self.assertEqual(stats.unreadable_blocks, 1)
+
+class CheckpointTest(unittest.TestCase):
+    """Checkpoints identify the address space and need --resume"""
+
+    def runTest(self):
+        space = buffer_space("WinXPSP2x86", "\x00" * 0x1000)
+        scanner = scan.BaseScanner()
+
+        keys = [scan.ScanCheckpoint(scanner, PagedBufferSpace(space, config, dtb = dtb), 0, None).key
+                for dtb in (0x1000, 0x2000)]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0]["space"], ["PagedBufferSpace", "BufferAddressSpace"])
+
+        ## Without --resume a scan does not checkpoint at all
+        created = []
+        class SpyCheckpoint(scan.ScanCheckpoint):
+            def __init__(self, *args, **kwargs):
+                created.append(self)
+                scan.ScanCheckpoint.__init__(self, *args, **kwargs)
+
+        saved = scan.ScanCheckpoint, scan.config.RESUME
+        scan.ScanCheckpoint = SpyCheckpoint
+        scan.config.update("RESUME", False)
+        try:
+            list(scan.BaseScanner().scan(PagedBufferSpace(space, config, dtb = 0)))
+        finally:
+            scan.ScanCheckpoint = saved[0]
+            scan.config.update("RESUME", saved[1])
+        self.assertEqual(created, [])
+
+class FarCheck(scan.ScannerCheck):
+    """Checks a marker well past the pool tag"""
+
+    def check(self, offset):
+        return self.address_space.read(offset + 0x3000, 4) == "Far!"
+
+class PoolIndexTest(unittest.TestCase):
+    """Scans from the pool tag index find what full scans do, and only on request"""
+
+    block_size = 0x10000
+
+    def setUp(self):
+        self.saved = constants.SCAN_BLOCKSIZE, scan.PoolTagIndex.__dict__["load"], scan.config.POOL_INDEX
+        constants.SCAN_BLOCKSIZE = self.block_size
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE, scan.PoolTagIndex.load = self.saved[:2]
+        scan.config.update("POOL_INDEX", self.saved[2])
+
+    def runTest(self):
+        class FarScanner(scan.PoolScanner):
+            checks = [("PoolTagCheck", dict(tag = "Far1")),
+                      ("FarCheck", {})]
+
+        space = buffer_space("WinXPSP2x86", "")
+        data = bytearray(4 * self.block_size)
+        tags = [0x100, self.block_size + 0x10, 2 * self.block_size - 0x4000]
+        for tag in tags:
+            data[tag:tag + 4] = "Far1"
+        for tag in tags[1:]:
+            data[tag + 0x3000:tag + 0x3004] = "Far!"
+        space.assign_buffer(str(data))
+        kernel_space = PagedBufferSpace(space, config, dtb = 0)
+
+        full = list(FarScanner().scan(kernel_space))
+        self.assertEqual(len(full), 2)
+
+        index = scan.PoolTagIndex(kernel_space, ["Far1"])
+        for tag in tags:
+            index.add("Far1", tag, [0, 0, 0])
+        loads = []
+        def load(address_space):
+            loads.append(address_space)
+            return index
+        scan.PoolTagIndex.load = staticmethod(load)
+
+        scan.config.update("POOL_INDEX", False)
+        self.assertEqual(list(FarScanner().scan(kernel_space)), full)
+        self.assertEqual(loads, [])
+
+        scan.config.update("POOL_INDEX", True)
+        self.assertEqual(list(FarScanner().scan(kernel_space)), full)
+        self.assertEqual(len(loads), 1)
+
+class UnpicklableSpace(PagedBufferSpace):
+    """A PagedBufferSpace which can be pickled but not unpickled"""
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        raise RuntimeError("Can not be reopened")
+
+class ParallelScanTest(unittest.TestCase):
+    """Parallel scans are only used where they give the same results"""
+
+    block_size = 0x10000
+
+    def setUp(self):
+        self.saved = constants.SCAN_BLOCKSIZE, scan.config.SCAN_WORKERS
+        constants.SCAN_BLOCKSIZE = self.block_size
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE = self.saved[0]
+        scan.config.update("SCAN_WORKERS", self.saved[1])
+
+    def runTest(self):
+        import volatility.plugins.kpcrscan as kpcrscan
+
+        class TagScanner(scan.BaseScanner):
+            checks = [("PoolTagCheck", dict(tag = "Par1"))]
+
+        space = buffer_space("WinXPSP2x86", "")
+        data = bytearray(8 * self.block_size)
+        tags = range(0x1000, len(data), 0x7000)
+        for tag in tags:
+            data[tag:tag + 4] = "Par1"
+        space.assign_buffer(str(data))
+
+        ## Stateful checks and small scans are not run in workers
+        scanner = kpcrscan.KPCRScanner()
+        scanner.buffer.profile = space.profile
+        scanner.build_constraints()
+        self.assertFalse(scanner.parallel_allowed([(0, len(data))]))
+
+        scanner = TagScanner()
+        scanner.build_constraints()
+        self.assertTrue(scanner.parallel_allowed([(0, len(data))]))
+        self.assertFalse(scanner.parallel_allowed([(0, self.block_size)]))
+
+        ## Workers which fail to open the address space hand the scan
+        ## back to the parent
+        scan.config.update("SCAN_WORKERS", 2)
+        self.assertEqual(list(TagScanner().scan(UnpicklableSpace(space, config, dtb = 0))), tags)
+
+class CheckOrderTest(unittest.TestCase):
+    """Check timing is sampled and stateful checks keep their place"""
+
+    def runTest(self):
+        class Check(scan.ScannerCheck):
+            def __init__(self, address_space, result, stateless = True):
+                scan.ScannerCheck.__init__(self, address_space)
+                self.result = result
+                self.stateless = stateless
+
+            def check(self, offset):
+                return self.result
+
+        scanner = scan.BaseScanner()
+        slow, kept, cheap = [Check(scanner.buffer, True), Check(scanner.buffer, True, False),
+                             Check(scanner.buffer, False)]
+        scanner.constraints = scanner.offset_constraints = [slow, kept, cheap]
+        scanner.check_stats = dict([(c, scanner.stats.add_check("Check")) for c in scanner.constraints])
+
+        clock = []
+        class Clock(object):
+            def time(self):
+                clock.append(None)
+                return 0.0
+
+        saved = scan.time
+        scan.time = Clock()
+        try:
+            for offset in range(scanner.reorder_interval - 1):
+                scanner.check_offset(offset)
+        finally:
+            scan.time = saved
+
+        count = scanner.reorder_interval - 1
+        self.assertEqual([scanner.check_stats[c][0] for c in (slow, kept, cheap)], [count] * 3)
+        self.assertEqual(len(clock), 2 * 3 * (count / scanner.timing_interval))
+
+        scanner.check_stats[slow][:] = [100, 0, 1.0]
+        scanner.check_stats[kept][:] = [100, 0, 0.0]
+        scanner.check_stats[cheap][:] = [100, 100, 0.001]
+        scanner.reorder_constraints()
+        self.assertEqual(scanner.offset_constraints, [slow, kept, cheap])
+
+        kept.stateless = True
+        scanner.reorder_constraints()
+        self.assertEqual(scanner.offset_constraints, [kept, cheap, slow])
+
+class WriterStopTest(unittest.TestCase):
+    """A stopped PipelinedWriter writes nothing more and leaves the target open"""
+
+    def runTest(self):
+        import threading
+        import volatility.plugins.imagecopy as imagecopy
+
+        class Target(object):
+            def __init__(self):
+                self.writes = []
+                self.closed = False
+                self.busy = threading.Event()
+                self.release = threading.Event()
+
+            def write(self, offset, data):
+                self.busy.set()
+                self.release.wait()
+                self.writes.append(offset)
+
+            def close(self):
+                self.closed = True
+
+        target = Target()
+        writer = imagecopy.PipelinedWriter(target)
+        for offset in range(3):
+            writer.write(offset, "A")
+
+        ## Let the first write finish only once stop has been called
+        target.busy.wait()
+        threading.Timer(0.1, target.release.set).start()
+        writer.stop()
+        self.assertFalse(writer.thread.is_alive())
+        self.assertEqual(target.writes, [0])
+        self.assertFalse(target.closed)
+        writer.stop()
+
+def main():
+    setup()
+    unittest.main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Measures read throughput of the run based address spaces.
+
+A synthetic crash dump or LiME image with many runs is written to a
+temporary file, then read sequentially and at random page offsets.
+With --linear the reads are repeated using the old linear run search
+so the two can be compared.
+
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+from optparse import OptionParser
+import os, random, struct, sys, tempfile, time, types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.conf as conf
+import volatility.debug as debug
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.addrspace as addrspace
+
+PAGE_SIZE = 0x1000
+
+## The 32 bit _DMP_HEADER keeps its runs at 0x6c, 8 bytes each,
+## and they must fit in the single header page
+CRASH_MAX_RUNS = (PAGE_SIZE - 0x6c) / 8
+
+def make_runs(count, pages, gap):
+    """Returns (base page, page count) tuples for count runs"""
+    runs = []
+    page = 0
+    for _ in range(count):
+        runs.append((page, pages))
+        page += pages + gap
+    return runs
+
+def page_data(page):
+    return struct.pack("<Q", page) * (PAGE_SIZE / 8)
+
+def write_crash(fd, runs):
+    header = ["\x00"] * PAGE_SIZE
+    def put(offset, data):
+        header[offset:offset + len(data)] = list(data)
+
+    put(0, "PAGEDUMP")
+    put(0x64, struct.pack("<II", len(runs), sum(c for _, c in runs)))
+    for i, (base, count) in enumerate(runs):
+        put(0x6c + i * 8, struct.pack("<II", base, count))
+    fd.write("".join(header))
+
+    for base, count in runs:
+        for page in range(base, base + count):
+            fd.write(page_data(page))
+
+def write_lime(fd, runs):
+    for base, count in runs:
+        start = base * PAGE_SIZE
+        end = (base + count) * PAGE_SIZE - 1
+        fd.write(struct.pack("<IIQQQ", 0x4c694d45, 1, start, end, 0))
+        for page in range(base, base + count):
+            fd.write(page_data(page))
+
+def linear_translate(self, addr):
+    """The run search translate used before the run index"""
+    for input_addr, output_addr, length in self.runs:
+        if addr >= input_addr and addr < input_addr + length:
+            return output_addr + (addr - input_addr)
+        if addr < input_addr:
+            return None
+    return None
+
+def load_space(filename, profile):
+    debug.setup()
+    registry.PluginImporter()
+    config = conf.ConfObject()
+    registry.register_global_options(config, addrspace.BaseAddressSpace)
+    registry.register_global_options(config, commands.Command)
+    config.parse_options(False)
+    config.update("location", "file://" + filename)
+    config.PROFILE = profile
+
+    import volatility.utils as utils
+    return utils.load_as(config, astype = 'physical')
+
+def bench(space, runs, read_size, samples):
+    pages = []
+    for base, count in runs:
+        pages.extend(range(base, base + count))
+
+    start = time.time()
+    total = 0
+    for base, count in runs:
+        addr = base * PAGE_SIZE
+        end = (base + count) * PAGE_SIZE
+        while addr < end:
+            data = space.read(addr, min(read_size, end - addr))
+            total += len(data)
+            addr += read_size
+    sequential = time.time() - start
+
+    rand = random.Random(0)
+    picks = [rand.choice(pages) for _ in range(samples)]
+    start = time.time()
+    for page in picks:
+        data = space.read(page * PAGE_SIZE, PAGE_SIZE)
+        if data != page_data(page):
+            raise RuntimeError("Page {0:#x} read back incorrectly".format(page))
+    randomly = time.time() - start
+
+    return total, sequential, randomly
+
+def report(name, total, sequential, randomly, samples):
+    print "{0:8} sequential {1:8.2f} MB/s   random {2:10.0f} pages/s".format(
+        name,
+        total / (1024.0 * 1024) / max(sequential, 1e-9),
+        samples / max(randomly, 1e-9))
+
+def main():
+    parser = OptionParser(usage = "%prog [options]")
+    parser.add_option("-f", "--format", default = "crash",
+                      help = "Image format to generate: crash or lime")
+    parser.add_option("-r", "--runs", type = "int", default = 2000,
+                      help = "Number of runs (crash dumps hold at most {0})".format(CRASH_MAX_RUNS))
+    parser.add_option("-p", "--pages", type = "int", default = 4,
+                      help = "Pages per run")
+    parser.add_option("-g", "--gap", type = "int", default = 1,
+                      help = "Pages between runs (0 makes them adjacent)")
+    parser.add_option("-s", "--read-size", type = "int", default = PAGE_SIZE,
+                      help = "Size of each sequential read")
+    parser.add_option("-n", "--samples", type = "int", default = 20000,
+                      help = "Number of random page reads")
+    parser.add_option("--profile", default = "WinXPSP2x86",
+                      help = "Profile used to parse the image")
+    parser.add_option("--linear", action = "store_true", default = False,
+                      help = "Also time the linear run search")
+    (opts, _args) = parser.parse_args()
+
+    ## Keep our options away from the volatility option parser
+    del sys.argv[1:]
+
+    if opts.format == "crash":
+        count = min(opts.runs, CRASH_MAX_RUNS)
+        writer = write_crash
+    elif opts.format == "lime":
+        count = opts.runs
+        writer = write_lime
+    else:
+        parser.error("Unknown format {0}".format(opts.format))
+
+    runs = make_runs(count, opts.pages, opts.gap)
+    fd, filename = tempfile.mkstemp(suffix = "." + opts.format)
+    try:
+        with os.fdopen(fd, "wb") as image:
+            writer(image, runs)
+
+        space = load_space(filename, opts.profile)
+        print "{0}: {1} runs of {2} pages, {3}".format(opts.format, len(space.get_runs()),
+                                                      opts.pages, space.__class__.__name__)
+
+        total, sequential, randomly = bench(space, runs, opts.read_size, opts.samples)
+        report("indexed", total, sequential, randomly, opts.samples)
+
+        if opts.linear:
+            space.translate = types.MethodType(linear_translate, space)
+            total, sequential, randomly = bench(space, runs, opts.read_size, opts.samples)
+            report("linear", total, sequential, randomly, opts.samples)
+    finally:
+        os.unlink(filename)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+#  -*- mode: python; -*-
+#
+# Volatility
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Round trip tests and a benchmark for the Xpress decoder.
+
+A corpus of page sized buffers (zeros, text, page tables, random data
+and so on, plus any files given on the command line) is compressed
+with a simple Xpress encoder, and the result is decoded by
+volatility.win32.xpress and by the original dictionary based decoder.
+Both must give back the input, and both must agree on truncated and
+corrupted blocks.  The decoding throughput of each is then reported.
+
+@license:      GNU General Public License 2.0
+@organization: Volatility Foundation
+"""
+
+from optparse import OptionParser
+import os, random, struct, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import volatility.win32.xpress as xpress
+
+PAGE_SIZE = 0x1000
+BLOCK_SIZE = 0x10000
+MAX_DISTANCE = 0x2000
+
+def xpress_encode(data):
+    """Compresses data in the Xpress format read by xpress_decode.
+
+    This is a plain greedy LZ77 match finder, good enough to produce
+    every kind of length encoding but not to rival the Windows one.
+    """
+    output = bytearray()
+    chains = {}
+    indicator_pos = None
+    indicator = 0
+    bits = 0
+    nibble_pos = None
+    i = 0
+
+    while i < len(data):
+        if bits == 0:
+            if indicator_pos is not None:
+                struct.pack_into("<L", output, indicator_pos, indicator)
+            indicator_pos = len(output)
+            output += "\x00" * 4
+            indicator = 0
+            bits = 32
+
+        best_length = best_distance = 0
+        key = data[i:i + 3]
+        if len(key) == 3:
+            for candidate in reversed(chains.get(key, [])[-16:]):
+                if i - candidate > MAX_DISTANCE:
+                    break
+                length = 3
+                limit = min(len(data) - i, 0xFFFF + 3)
+                while length < limit and data[candidate + length] == data[i + length]:
+                    length += 1
+                if length > best_length:
+                    best_length, best_distance = length, i - candidate
+
+        bits -= 1
+        if best_length < 3:
+            output += data[i]
+            step = 1
+        else:
+            indicator |= 1 << bits
+            length = best_length - 3
+            offset = best_distance - 1
+            if length < 7:
+                output += struct.pack("<H", (offset << 3) | length)
+            else:
+                output += struct.pack("<H", (offset << 3) | 7)
+                length -= 7
+                nibble = min(length, 15)
+                if nibble_pos is None:
+                    nibble_pos = len(output)
+                    output.append(nibble)
+                else:
+                    output[nibble_pos] |= nibble << 4
+                    nibble_pos = None
+                if nibble == 15:
+                    length -= 15
+                    if length < 255:
+                        output.append(length)
+                    else:
+                        output.append(255)
+                        output += struct.pack("<H", best_length - 3)
+            step = best_length
+
+        for j in range(i, min(i + step, len(data) - 2)):
+            chains.setdefault(data[j:j + 3], []).append(j)
+        i += step
+
+    if indicator_pos is not None:
+        struct.pack_into("<L", output, indicator_pos, indicator)
+
+    return str(output)
+
+def reference_decode(inputBuffer):
+    """The dictionary based decoder which xpress_decode replaced"""
+    outputBuffer = {}
+    outputIndex = 0
+    inputIndex = 0
+    indicatorBit = 0
+    nibbleIndex = 0
+
+    def recombine(outbuf):
+        return "".join(outbuf[k] for k in sorted(outbuf.keys()))
+
+    while inputIndex < len(inputBuffer):
+        if (indicatorBit == 0):
+            try:
+                indicator = struct.unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
+            except struct.error:
+                return recombine(outputBuffer)
+            inputIndex += 4
+            indicatorBit = 32
+
+        indicatorBit = indicatorBit - 1
+        if not (indicator & (1 << indicatorBit)):
+            try:
+                outputBuffer[outputIndex] = inputBuffer[inputIndex]
+            except IndexError:
+                return recombine(outputBuffer)
+            inputIndex += 1
+            outputIndex += 1
+        else:
+            try:
+                length = struct.unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+            except struct.error:
+                return recombine(outputBuffer)
+            inputIndex += 2
+            offset = length / 8
+            length = length % 8
+            if length == 7:
+                if nibbleIndex == 0:
+                    nibbleIndex = inputIndex
+                    length = ord(inputBuffer[inputIndex]) % 16
+                    inputIndex += 1
+                else:
+                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    nibbleIndex = 0
+                if length == 15:
+                    length = ord(inputBuffer[inputIndex])
+                    inputIndex += 1
+                    if length == 255:
+                        try:
+                            length = struct.unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+                        except struct.error:
+                            return recombine(outputBuffer)
+                        inputIndex = inputIndex + 2
+                        length = length - (15 + 7)
+                    length = length + 15
+                length = length + 7
+            length = length + 3
+
+            while length != 0:
+                try:
+                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
+                except KeyError:
+                    return recombine(outputBuffer)
+                outputIndex += 1
+                length -= 1
+
+    return recombine(outputBuffer)
+
+def make_corpus(rand):
+    """Returns a list of (name, data) test buffers"""
+    text = " ".join(rand.choice(["volatility", "memory", "\\Device\\HarddiskVolume1",
+                                 "svchost.exe", "kernel32.dll", "the", "a", "process"])
+                    for _ in range(20000))
+    page_table = "".join(struct.pack("<I", (rand.randrange(0x10000) << 12) | 0x67)
+                         for _ in range(PAGE_SIZE / 4))
+
+    corpus = [
+        ("empty", ""),
+        ("one byte", "A"),
+        ("three bytes", "ABC"),
+        ("zero page", "\x00" * PAGE_SIZE),
+        ("zero block", "\x00" * BLOCK_SIZE),
+        ("short run", "AB" * 5),
+        ("nibble lengths", "".join(("X" * n) + chr(n) for n in range(1, 40))),
+        ("byte lengths", "".join(("Y" * n) + chr(n & 0xFF) for n in range(20, 300, 7))),
+        ("long run", "Z" + "\xCC" * 40000),
+        ("text", text[:BLOCK_SIZE]),
+        ("page tables", page_table * 16),
+        ("random", "".join(chr(rand.randrange(256)) for _ in range(BLOCK_SIZE))),
+        ("mixed", "".join(rand.choice(["\x00" * 512, text[:512], page_table[:512],
+                                       "".join(chr(rand.randrange(256)) for _ in range(512))])
+                          for _ in range(128))),
+    ]
+
+    for length in range(1, 70):
+        corpus.append(("{0} random bytes".format(length),
+                       "".join(chr(rand.randrange(4)) for _ in range(length))))
+
+    return corpus
+
+def check(corpus, rand, mutations):
+    failures = 0
+    blocks = []
+    for name, data in corpus:
+        encoded = xpress_encode(data)
+        blocks.append(encoded)
+        for decoder in (xpress.xpress_decode, reference_decode):
+            if decoder(encoded) != data:
+                print "FAIL round trip of {0} with {1}".format(name, decoder.__name__)
+                failures += 1
+
+        ## Damaged blocks must decode the same way, or the reference must fail
+        for _ in range(mutations):
+            damaged = bytearray(encoded)
+            if damaged and rand.random() < 0.5:
+                damaged[rand.randrange(len(damaged))] = rand.randrange(256)
+            damaged = str(damaged[:rand.randint(0, len(damaged))])
+            try:
+                expected = reference_decode(damaged)
+            except (IndexError, KeyError):
+                continue
+            if xpress.xpress_decode(damaged) != expected:
+                print "FAIL damaged {0}: {1!r}".format(name, damaged[:64])
+                failures += 1
+
+    return failures, blocks
+
+def bench(decoder, blocks, rounds):
+    total = 0
+    start = time.time()
+    for _ in range(rounds):
+        for block in blocks:
+            total += len(decoder(block))
+    elapsed = max(time.time() - start, 1e-9)
+    return total / (1024.0 * 1024) / elapsed
+
+def main():
+    parser = OptionParser(usage = "%prog [options] [file ...]")
+    parser.add_option("-r", "--rounds", type = "int", default = 3,
+                      help = "Number of times to decode the corpus")
+    parser.add_option("-m", "--mutations", type = "int", default = 20,
+                      help = "Number of damaged copies of each block to check")
+    parser.add_option("--seed", type = "int", default = 0,
+                      help = "Seed for the generated corpus")
+    (opts, args) = parser.parse_args()
+
+    rand = random.Random(opts.seed)
+    corpus = make_corpus(rand)
+    for filename in args:
+        data = open(filename, "rb").read()
+        for offset in range(0, len(data), BLOCK_SIZE):
+            corpus.append(("{0}@{1:#x}".format(filename, offset), data[offset:offset + BLOCK_SIZE]))
+
+    failures, blocks = check(corpus, rand, opts.mutations)
+    size = sum(len(data) for _, data in corpus)
+    print "{0} buffers ({1} bytes, {2} compressed), {3} failures".format(
+        len(corpus), size, sum(len(b) for b in blocks), failures)
+
+    print "xpress_decode    {0:8.2f} MB/s".format(bench(xpress.xpress_decode, blocks, opts.rounds))
+    print "reference_decode {0:8.2f} MB/s".format(bench(reference_decode, blocks, opts.rounds))
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,7 @@
 
 #pylint: disable-msg=C0111
 
+import bisect
 import fractions
 import volatility.obj as obj
 import volatility.registry as registry
@@ -214,44 +215,67 @@ class AbstractDiscreteAllocMemory(BaseAddressSpace):
         if not self.alignment_gcd or not self.minimum_size:
             self.calculate_alloc_stats()
 
+        alignment = self.alignment_gcd
+        translate = self.translate
+        chunks = []
         position = addr
-        remaining = length
-        buff = ""
-        read = self.base.zread if pad else self.base.read
-
-        # For each allocation...
-        while remaining > 0:
-            # Determine whether we're within an alloc or not
-            alloc_remaining = (self.alignment_gcd - (addr % self.alignment_gcd))
-            # Try to jump out early
-            paddr = self.translate(position)
-            datalen = min(remaining, alloc_remaining)
-            if paddr is None:
-                if not pad:
-                    return None
-                buff += "\x00" * datalen
-            else:
-                # This accounts for a special edge case
-                # when the address is valid in this address space
-                # but not in the underlying (base) address space.
-                # We have seen this happen with IA32/FileAddr
+        end = addr + length
 
-                if self.base.is_valid_address(paddr):
-                    data = read(paddr, datalen)
-                else:
-                    data = None
+        # Allocations which are contiguous in the base address space are
+        # gathered into a run (run_addr, run_paddr, run_length) and read
+        # with a single call
+        run_addr = run_paddr = None
+        run_length = 0
+
+        while position < end:
+            datalen = min(end - position, alignment - (position % alignment))
+            paddr = translate(position)
 
-                if data is None:
+            if paddr is not None and run_length and paddr == run_paddr + run_length:
+                run_length += datalen
+            else:
+                if run_length:
+                    data = self._read_run(run_addr, run_paddr, run_length, pad)
+                    if isinstance(data, obj.NoneObject):
+                        return data
+                    chunks.append(data)
+                    run_length = 0
+
+                if paddr is None:
                     if not pad:
-                        return obj.NoneObject("Could not read_chunks from addr " + hex(position) + " of size " + hex(datalen))
-                    data = "\x00" * datalen
-                buff += data
+                        return None
+                    chunks.append("\x00" * datalen)
+                else:
+                    run_addr, run_paddr, run_length = position, paddr, datalen
+
             position += datalen
-            remaining -= datalen
-            assert (addr + length == position + remaining), "Address + length != position + remaining (" + hex(addr + length) + " != " + hex(position + remaining) + ") in " + self.base.__class__.__name__
-            assert (position - addr == len(buff)), "Position - address != len(buff) (" + str(position - addr) + " != " + str(len(buff)) + ") in " + self.base.__class__.__name__
+
+        if run_length:
+            data = self._read_run(run_addr, run_paddr, run_length, pad)
+            if isinstance(data, obj.NoneObject):
+                return data
+            chunks.append(data)
+
+        buff = "".join(chunks)
+        assert len(buff) == max(length, 0), "Read " + hex(len(buff)) + " bytes instead of " + hex(length) + " in " + self.base.__class__.__name__
         return buff
 
+    def _read_run(self, addr, paddr, length, pad):
+        """Reads a run of allocations that are contiguous in the base address space"""
+        if pad:
+            return self.base.zread(paddr, length)
+
+        # This accounts for a special edge case
+        # when the address is valid in this address space
+        # but not in the underlying (base) address space.
+        # We have seen this happen with IA32/FileAddr
+        if self.base.is_valid_address(paddr):
+            data = self.base.read(paddr, length)
+            if data is not None and len(data) == length:
+                return data
+
+        return obj.NoneObject("Could not read_chunks from addr " + hex(addr) + " of size " + hex(length))
+
     def read(self, addr, length):
         '''
         This method reads 'length' bytes from the specified 'addr'.
@@ -273,6 +297,10 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
                   A run is a tuple of (input/domain/virtual address, output/range/physical address, size of segment)
     """
 
+    # Not all subclasses call our __init__, so these live on the class
+    _run_index = None
+    _last_run = None
+
     def __init__(self, base, config, *args, **kwargs):
         AbstractDiscreteAllocMemory.__init__(self, base, config, *args, **kwargs)
         self.runs = []
@@ -286,18 +314,61 @@ class AbstractRunBasedMemory(AbstractDiscreteAllocMemory):
         """Get the header info"""
         return self.header
 
+    def build_run_index(self):
+        """Builds the lookup table used by translate.
+
+        Runs are sorted by input address and adjacent runs which are
+        also contiguous in the output are merged.  The table is kept
+        separately so that self.runs (which plugins such as raw2dmp
+        and crashinfo report) is left exactly as the subclass built it.
+        """
+        table = []
+        for input_addr, output_addr, length in sorted(self.runs):
+            # Where runs overlap the one that starts first wins
+            if table and input_addr < table[-1][1]:
+                skip = table[-1][1] - input_addr
+                input_addr, output_addr, length = input_addr + skip, output_addr + skip, length - skip
+            if length <= 0:
+                continue
+            delta = output_addr - input_addr
+            if table and table[-1][1] == input_addr and table[-1][2] == delta:
+                table[-1][1] = input_addr + length
+            else:
+                table.append([input_addr, input_addr + length, delta])
+
+        table = [tuple(entry) for entry in table]
+        starts = [entry[0] for entry in table]
+
+        # Subclasses replace or extend self.runs after __init__, so
+        # remember what the index was built from
+        self._run_index = (self.runs, len(self.runs), starts, table)
+        self._last_run = None
+        return starts, table
+
     def translate(self, addr):
         """Find the offset in the file where a memory address can be found.
 
         @param addr: a memory address
         """
-        for input_addr, output_addr, length in self.runs:
-            if addr >= input_addr and addr < input_addr + length:
-                return output_addr + (addr - input_addr)
-            # Since runs are in order, we can bail out early if we're
-            # looking for something before the start of the current one
-            if addr < input_addr:
-                return None
+        # Reads are mostly sequential, so try the last run first
+        last = self._last_run
+        if last is not None and last[0] <= addr < last[1]:
+            return addr + last[2]
+
+        index = self._run_index
+        if index is None or index[0] is not self.runs or index[1] != len(self.runs):
+            starts, table = self.build_run_index()
+        else:
+            starts, table = index[2], index[3]
+
+        i = bisect.bisect_right(starts, addr) - 1
+        if i < 0:
+            return None
+
+        run = table[i]
+        if addr < run[1]:
+            self._last_run = run
+            return addr + run[2]
 
         return None
 
@@ -35,7 +35,7 @@ if __name__ == '__main__':
     sys.path.append("..")
 
 import cPickle as pickle # pickle implementation must match that in volatility.cache
-import struct, copy, operator
+import struct, copy, operator, types, collections
 import volatility.debug as debug
 import volatility.fmtspec as fmtspec
 import volatility.exceptions as exceptions
@@ -183,8 +183,32 @@ def Object(theType, offset, vm, name = None, **kwargs):
     ## This is a serious error.
     debug.warning("Cant find object {0} in profile {1}?".format(theType, vm.profile))
 
+def _slot_descriptors(cls):
+    """ Returns the slot descriptors of a class and all its bases """
+    try:
+        return _slot_cache[cls]
+    except KeyError:
+        pass
+
+    result = []
+    for klass in cls.__mro__:
+        for value in vars(klass).values():
+            if isinstance(value, types.MemberDescriptorType):
+                result.append(value)
+
+    _slot_cache[cls] = result
+    return result
+
+_slot_cache = {}
+
 class BaseObject(object):
 
+    # Objects are created in very large numbers, so the standard
+    # attributes are kept in slots.  The __dict__ slot remains for
+    # subclasses and newattr, but is only allocated when first used.
+    __slots__ = ('_vol_theType', '_vol_offset', '_vol_vm', '_vol_native_vm',
+                 '_vol_parent', '_vol_name', '__dict__')
+
     # We have **kwargs here, but it's unclear if it's a good idea
     # Benefit is objects will never fail with duff parameters
     # Downside is typos won't show up and be difficult to diagnose
@@ -351,8 +375,8 @@ class BaseObject(object):
             for arg in self.__init__.func_code.co_varnames:
                 if (arg not in result and
                     arg not in "self parent profile args".split()):
-                    result[arg] = self.__dict__[arg]
-        except KeyError:
+                    result[arg] = self._get_instance_attr(arg)
+        except (KeyError, AttributeError):
             debug.post_mortem()
             raise pickle.PicklingError("Object {0} at 0x{1:08x} cannot be cached because of missing attribute {2}".format(self.obj_name, self.obj_offset, arg))
 
@@ -370,7 +394,28 @@ class BaseObject(object):
         ## needed because __setstate__ can not return a new object,
         ## but must update the current object instead. I'm sure ikelos
         ## will object!!! I am open to suggestions ...
-        self.__dict__ = new_object.__dict__
+        object.__setattr__(self, '__dict__', new_object.__dict__)
+        for descriptor in _slot_descriptors(new_object.__class__):
+            try:
+                descriptor.__set__(self, descriptor.__get__(new_object))
+            except AttributeError:
+                pass
+
+    def _get_instance_attr(self, attr):
+        """ Returns an attribute held by this instance, in a slot or its
+        __dict__, without falling back to the class or __getattr__.
+        """
+        descriptor = getattr(self.__class__, attr, None)
+        if isinstance(descriptor, types.MemberDescriptorType):
+            return descriptor.__get__(self)
+        return self.__dict__[attr]
+
+    def _has_instance_attr(self, attr):
+        try:
+            self._get_instance_attr(attr)
+        except (KeyError, AttributeError):
+            return False
+        return True
 
 def CreateMixIn(mixin):
     def make_method(name):
@@ -399,6 +444,8 @@ def CreateMixIn(mixin):
 
 class NumericProxyMixIn(object):
     """ This MixIn implements the numeric protocol """
+    __slots__ = ()
+
     _specials = [
         ## Number protocols
         '__add__', '__sub__', '__mul__', '__floordiv__', '__mod__', '__divmod__',
@@ -420,6 +467,8 @@ class NumericProxyMixIn(object):
 CreateMixIn(NumericProxyMixIn)
 
 class NativeType(BaseObject, NumericProxyMixIn):
+    __slots__ = ('format_string',)
+
     def __init__(self, theType, offset, vm, format_string = None, **kwargs):
         BaseObject.__init__(self, theType, offset, vm, **kwargs)
         NumericProxyMixIn.__init__(self)
@@ -463,6 +512,8 @@ class NativeType(BaseObject, NumericProxyMixIn):
 
 class BitField(NativeType):
     """ A class splitting an integer into a bunch of bit. """
+    __slots__ = ('start_bit', 'end_bit', 'native_type')
+
     def __init__(self, theType, offset, vm, start_bit = 0, end_bit = 32, native_type = None, **kwargs):
         # Defaults to profile-endian address, but can be overridden by native_type
         format_string = vm.profile.native_types.get(native_type, vm.profile.native_types['address'])[1]
@@ -481,6 +532,8 @@ class BitField(NativeType):
 
 
 class Pointer(NativeType):
+    __slots__ = ('target',)
+
     def __init__(self, theType, offset, vm, target = None, **kwargs):
         # Default to profile-endian address
         # We don't allow native_type overriding for pointers since we can't dereference invalid pointers anyway
@@ -543,6 +596,8 @@ class Pointer(NativeType):
         return result.m(memname)
 
 class Void(NativeType):
+    __slots__ = ()
+
     def __init__(self, theType, offset, vm, **kwargs):
         # Default to profile-endian unsigned long
         # This should never need to be overridden, but can be by changing the 'Void' value in a profile's object_classes
@@ -563,6 +618,11 @@ class Void(NativeType):
 
 class Array(BaseObject):
     """ An array of objects of the same size """
+    __slots__ = ('count', 'original_offset', 'target', 'current')
+
+    # Arrays of native values are read this many bytes at a time when iterated
+    block_size = 0x10000
+
     def __init__(self, theType, offset, vm, parent = None,
                  count = 1, targetType = None, target = None, name = None, **kwargs):
         ## Instantiate the first object on the offset:
@@ -593,21 +653,67 @@ class Array(BaseObject):
     def size(self):
         return self.count * self.current.size()
 
+    def _native_format(self):
+        """ Returns the struct format of the elements if they are plain
+        native values (including pointers), otherwise None.
+        """
+        current = self.current
+        if isinstance(current, NativeType) and current.__class__.v.im_func is NativeType.v.im_func:
+            return current.format_string
+        return None
+
+    def _read_block(self, position, count):
+        """ Returns a vm holding a copy of count elements from position,
+        or the array's own vm if they cannot all be read.
+        """
+        size = self.current.size()
+        offset = self.original_offset + position * size
+        data = self.obj_vm.read(offset, count * size)
+        if data and len(data) == count * size:
+            return SnapshotVM(self.obj_vm, offset, data)
+        return self.obj_vm
+
+    def values(self):
+        """ Returns a list of the values of all the elements.
+
+        Arrays of native values are read at once and decoded with
+        struct, without creating an object per element.  Otherwise (or if
+        the array cannot be read in one go) each element is evaluated, so
+        unreadable elements appear as NoneObjects.
+        """
+        fmt = self._native_format()
+        if fmt:
+            data = self.obj_vm.read(self.original_offset, self.size())
+            if data and len(data) == self.size():
+                return list(struct.unpack("{0}{1}{2}".format(fmt[0], self.count, fmt[1:]), data))
+
+        return [self[position].v() for position in range(self.count)]
+
     def __iter__(self):
         ## This method is better than the __iter__/next method as it
         ## is reentrant
-        for position in range(0, self.count):
 
-            ## We don't want to stop on a NoneObject.  Its
-            ## entirely possible that this array contains a bunch of
-            ## pointers and some of them may not be valid (or paged
-            ## in). This should not stop us though we just return the
-            ## invalid pointers to our callers.  It's up to the callers
-            ## to do what they want with the array.
-            if (self.current == None):
-                return
+        ## We don't want to stop on a NoneObject.  Its
+        ## entirely possible that this array contains a bunch of
+        ## pointers and some of them may not be valid (or paged
+        ## in). This should not stop us though we just return the
+        ## invalid pointers to our callers.  It's up to the callers
+        ## to do what they want with the array.
+        if (self.current == None):
+            return
+
+        ## Native values are read a block at a time and decoded from
+        ## the copy, rather than each element reading its own bytes
+        block = 0
+        if self._native_format():
+            block = max(self.block_size / self.current.size(), 1)
+
+        vm = self.obj_vm
+        for position in range(0, self.count):
+            if block and position % block == 0:
+                vm = self._read_block(position, min(block, self.count - position))
 
-            yield self[position]
+            yield self._get_element(position, vm)
 
     def __repr__(self):
         result = [ x.__str__() for x in self ]
@@ -644,13 +750,16 @@ class Array(BaseObject):
         if pos < 0:
             pos = self.count - pos
 
+        return self._get_element(pos, self.obj_vm)
+
+    def _get_element(self, pos, vm):
         ## Check if the offset is valid
         offset = self.original_offset + pos * self.current.size()
 
-        if self.obj_vm.is_valid_address(offset):
+        if vm.is_valid_address(offset):
             # Ensure both the true VM and offsetlayer are copied across
             return self.target(offset = offset,
-                               vm = self.obj_vm,
+                               vm = vm,
                                native_vm = self.obj_native_vm,
                                parent = self,
                                name = "{0} {1}".format(self.obj_name, pos))
@@ -664,8 +773,77 @@ class Array(BaseObject):
         if item != None:
             item.write(value)
 
+class SnapshotVM(object):
+    """ A view of an address space with one region read in advance.
+
+        Reads which fall entirely inside the region are served from the
+        buffered data, anything else (and every other attribute) goes to
+        the underlying address space.
+    """
+    def __init__(self, vm, offset, data):
+        self.vm = vm
+        self.start = offset
+        self.end = offset + len(data)
+        self.data = data
+
+    def __getattr__(self, attr):
+        return getattr(self.vm, attr)
+
+    def __getstate__(self):
+        raise pickle.PicklingError("Snapshots do not support caching")
+
+    def __eq__(self, other):
+        if isinstance(other, SnapshotVM):
+            other = other.vm
+        return self.vm == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.vm)
+
+    def covers(self, addr, length):
+        return self.start <= addr and addr + length <= self.end
+
+    def read(self, addr, length):
+        if self.covers(addr, length):
+            return self.data[addr - self.start:addr - self.start + length]
+        return self.vm.read(addr, length)
+
+    def zread(self, addr, length):
+        if self.covers(addr, length):
+            return self.data[addr - self.start:addr - self.start + length]
+        return self.vm.zread(addr, length)
+
+    def is_valid_address(self, addr):
+        if self.start <= addr < self.end:
+            return True
+        return self.vm.is_valid_address(addr)
+
+    def write(self, addr, data):
+        result = self.vm.write(addr, data)
+        if result and addr < self.end and addr + len(data) > self.start:
+            ## Keep the buffered copy in step with what was written
+            fresh = self.vm.read(self.start, self.end - self.start)
+            if fresh:
+                self.data = fresh
+        return result
+
+def unwrap_vm(vm):
+    """ Returns the address space behind vm if it is a snapshot.
+
+        Use this before building a new address space from an object's
+        obj_vm, since a SnapshotVM can not stand in for its class.
+    """
+    if isinstance(vm, SnapshotVM):
+        return vm.vm
+    return vm
+
 class CType(BaseObject):
     """ A CType is an object which represents a c struct """
+    __slots__ = ('members', 'struct_size', '__initialized')
+
     def __init__(self, theType, offset, vm, name = None, members = None, struct_size = 0, **kwargs):
         """ This must be instantiated with a dict of members. The keys
         are the offsets, the values are Curried Object classes that
@@ -676,6 +854,7 @@ class CType(BaseObject):
             debug.debug("No members specified for CType {0} named {1}".format(theType, name), level = 2)
             members = {}
 
+        object.__setattr__(self, '_CType__initialized', False)
         self.members = members
         self.struct_size = struct_size
         BaseObject.__init__(self, theType, offset, vm, name = name, **kwargs)
@@ -733,15 +912,43 @@ class CType(BaseObject):
 
         return result
 
+    def snapshot(self):
+        """ Returns a copy of this struct which reads all of its bytes at once.
+
+            Members (including nested structs and arrays) are decoded from
+            that single read instead of reading the address space for each
+            one, while pointers still dereference through the native vm.
+            The values are those at the time of the snapshot.  If the whole
+            struct cannot be read, the struct itself is returned.
+        """
+        vm = self.obj_vm
+        if isinstance(vm, SnapshotVM) and vm.covers(self.obj_offset, self.struct_size):
+            return self
+        if not vm.profile.has_type(self.obj_type):
+            return self
+
+        data = vm.read(self.obj_offset, self.struct_size)
+        if not data or len(data) != self.struct_size:
+            return self
+
+        result = Object(self.obj_type, self.obj_offset, SnapshotVM(vm, self.obj_offset, data),
+                        native_vm = self.obj_native_vm, parent = self.obj_parent,
+                        name = self.obj_name)
+        return result or self
+
     def __getattr__(self, attr):
         return self.m(attr)
 
     def __setattr__(self, attr, value):
         """Change underlying members"""
         # Special magic to allow initialization
-        if not self.__dict__.has_key('_CType__initialized'):  # this test allows attributes to be set in the __init__ method
+        try:
+            initialized = CType.__initialized.__get__(self)
+        except AttributeError:
+            initialized = False
+        if not initialized:  # this test allows attributes to be set in the __init__ method
             return BaseObject.__setattr__(self, attr, value)
-        elif self.__dict__.has_key(attr):       # any normal attributes are handled normally
+        elif self._has_instance_attr(attr):       # any normal attributes are handled normally
             return BaseObject.__setattr__(self, attr, value)
         else:
             obj = self.m(attr)
@@ -814,6 +1021,111 @@ def VolMagic(vm):
     return Object("VOLATILITY_MAGIC", 0x0, vm = vm)
 
 
+class RecordUnpacker(object):
+    """ Decodes many records of a fixed layout type at once.
+
+        Each field is (name, offset, size, byte order, format character,
+        count, bits), where count is None for a single value and bits is
+        None or the (start_bit, end_bit) of a BitField.  Fields which
+        overlap (unions) are spread over several struct.Struct layers, so
+        every layer is a plain run of values that struct can unpack in
+        one call.
+    """
+    def __init__(self, name, size, fields):
+        self.name = name
+        self.size = size
+        typename = "".join(c if c.isalnum() else '_' for c in name).strip('_')
+        if not typename or typename[0].isdigit():
+            typename = 'record_' + typename
+        self.record = collections.namedtuple(typename, [f[0] for f in fields], rename = True)
+
+        ## Fields sharing the same bytes (BitFields) share one value
+        units = {}
+        layers = []
+        for _name, offset, fsize, order, char, count, _bits in sorted(fields, key = lambda f: (f[1], -f[2])):
+            key = (offset, fsize, order, char, count)
+            if key in units:
+                continue
+            for layer in layers:
+                if layer[0] == order and layer[1] <= offset:
+                    break
+            else:
+                layer = [order, 0, []]
+                layers.append(layer)
+            layer[2].append((offset, key))
+            layer[1] = offset + fsize
+            units[key] = None
+
+        self.layers = []
+        position = 0
+        for order, _end, members in layers:
+            fmt = order
+            end = 0
+            for offset, key in members:
+                fmt += "x" * (offset - end)
+                count = key[4]
+                fmt += "{0}{1}".format('' if count is None else count, key[3])
+                units[key] = position
+                if count is not None and key[3] != 's':
+                    position += count
+                else:
+                    position += 1
+                end = offset + key[1]
+            self.layers.append(struct.Struct(fmt))
+
+        ## How to pick each field out of the concatenated layer values
+        self.getters = []
+        self.simple = True
+        for _name, offset, fsize, order, char, count, bits in fields:
+            index = units[(offset, fsize, order, char, count)]
+            if count is not None and char != 's':
+                self.getters.append((index, count, None))
+                self.simple = False
+            else:
+                self.getters.append((index, None, bits))
+                if bits:
+                    self.simple = False
+
+        ## When every field is a single value in its own position
+        ## the layer values are already the record
+        if self.simple and [g[0] for g in self.getters] != range(len(self.getters)):
+            self.simple = False
+
+    def unpack_from(self, data, offset = 0):
+        """ Returns the record starting at offset in data """
+        values = ()
+        for layer in self.layers:
+            values += layer.unpack_from(data, offset)
+
+        if self.simple:
+            return self.record._make(values)
+
+        result = []
+        for index, count, bits in self.getters:
+            if count is not None:
+                result.append(values[index:index + count])
+            elif bits:
+                result.append((values[index] & ((1 << bits[1]) - 1)) >> bits[0])
+            else:
+                result.append(values[index])
+        return self.record._make(result)
+
+    def unpack(self, data, count = None, offset = 0):
+        """ Returns a list of count records laid out one after another from
+            offset in data, or as many whole records as data holds.
+        """
+        available = (len(data) - offset) / self.size
+        if count is None or count > available:
+            count = available
+
+        if self.simple and len(self.layers) == 1:
+            unpack, make = self.layers[0].unpack_from, self.record._make
+            return [make(unpack(data, position))
+                    for position in xrange(offset, offset + count * self.size, self.size)]
+
+        return [self.unpack_from(data, position)
+                for position in xrange(offset, offset + count * self.size, self.size)]
+
 #### This must live here, otherwise there are circular dependency issues
 ##
 ## The Profile relies on several classes in obj.py, because  
@@ -936,6 +1248,12 @@ class Profile(object):
             left in a bad/unusable state
         """
 
+        # Forget any layout queries answered for the previous types
+        self._offset_cache = {}
+        self._size_cache = {}
+        self._member_cache = {}
+        self._record_cache = {}
+
         # Load the native types
         self.types = {}
         for nt, value in self.native_types.items():
@@ -996,20 +1314,115 @@ class Profile(object):
 
     def get_obj_offset(self, name, member):
         """ Returns a members offset within the struct """
+        key = (name, member)
+        try:
+            return self._offset_cache[key]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
         offset, _cls = tmp.members[member]
 
+        self._offset_cache[key] = offset
         return offset
 
     def get_obj_size(self, name):
         """Returns the size of a struct"""
+        try:
+            return self._size_cache[name]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
-        return tmp.size()
+        size = self._size_cache[name] = tmp.size()
+        return size
 
     def obj_has_member(self, name, member):
         """Returns whether an object has a certain member"""
+        key = (name, member)
+        try:
+            return self._member_cache[key]
+        except KeyError:
+            pass
+
         tmp = self._get_dummy_obj(name)
-        return hasattr(tmp, member)
+        result = self._member_cache[key] = hasattr(tmp, member)
+        return result
+
+    def _record_field(self, name, offset, spec):
+        """ Returns the RecordUnpacker field for a member, or None if the
+            member is not a fixed size native value, pointer, BitField or
+            array of native values.
+        """
+        kind = spec[0]
+        count = None
+        bits = None
+        if kind == 'pointer':
+            kind = 'address'
+        elif kind == 'pointer64':
+            kind = 'unsigned long long'
+        elif kind == 'array' and not callable(spec[1]) and len(spec) > 2 and len(spec[2]) == 1:
+            count = int(spec[1])
+            kind = spec[2][0]
+        elif kind == 'BitField' and len(spec) > 1 and isinstance(spec[1], dict):
+            args = spec[1]
+            kind = args.get('native_type') or 'address'
+            bits = (args.get('start_bit', 0), args.get('end_bit', 32))
+        elif len(spec) != 1:
+            return None
+
+        native = self.native_types.get(kind)
+        if type(native) != list:
+            return None
+        size, fmt = native
+        order, char = fmt[0], fmt[1:]
+        if count is not None:
+            size *= count
+            if char == 'c':
+                char = 's'
+        return (name, offset, size, order, char, count, bits)
+
+    def get_record_unpacker(self, name):
+        """ Returns a RecordUnpacker for a type whose members are all
+            fixed size native values, or None if the type has any other
+            kind of member.
+        """
+        try:
+            return self._record_cache[name]
+        except KeyError:
+            pass
+
+        result = None
+        if name in self.vtypes:
+            size, raw_members = self.vtypes[name]
+            fields = []
+            for member, value in sorted(raw_members.items()):
+                if callable(value):
+                    continue
+                field = None
+                if value[0] is not None and not callable(value[0]):
+                    field = self._record_field(member, value[0], value[1])
+                if not field or field[1] < 0 or field[1] + field[2] > size:
+                    fields = None
+                    break
+                fields.append(field)
+
+            if fields:
+                fields.sort(key = lambda f: (f[1], f[0]))
+                result = RecordUnpacker(name, size, fields)
+
+        self._record_cache[name] = result
+        return result
+
+    def unpack_records(self, name, data, count = None, offset = 0):
+        """ Decodes count consecutive records of type name from the string
+            data, starting at offset, into named tuples.  If count is None
+            as many whole records as data holds are decoded.
+        """
+        unpacker = self.get_record_unpacker(name)
+        if unpacker is None:
+            raise ValueError("Type {0} does not have a fixed native layout".format(name))
+        return unpacker.unpack(data, count, offset)
 
     def merge_overlay(self, overlay):
         """Applies an overlay to the profile's vtypes"""
@@ -62,6 +62,7 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
     order = 60
     pae = False
     checkname = 'AMD64ValidAS'
+    page_shifts = (page_shift, pde_shift, 30)
     paging_address_space = True
     minimum_size = 0x1000
     alignment_gcd = 0x1000
@@ -164,10 +165,11 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
     def get_paddr(self, vaddr, pte):
         return self.pte_pfn(pte) | (vaddr & ((1 << page_shift) - 1))
 
-    def vtop(self, vaddr):
+    def walk(self, vaddr):
         '''
         This method translates an address in the virtual
-        address space to its associated physical address.
+        address space to its associated physical address
+        and the size (shift) of its page.
         Invalid entries should be handled with operating
         system abstractions.
         '''
@@ -182,16 +184,16 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
             return retVal
 
         if self.page_size_flag(pdpe):
-            return self.get_1GB_paddr(vaddr, pdpe)
+            return (self.get_1GB_paddr(vaddr, pdpe), 30)
 
         pgd = self.get_pgd(vaddr, pdpe)
         if self.entry_present(pgd):
             if self.page_size_flag(pgd):
-                retVal = self.get_2MB_paddr(vaddr, pgd)
+                retVal = (self.get_2MB_paddr(vaddr, pgd), pde_shift)
             else:
                 pte = self.get_pte(vaddr, pgd)
                 if self.entry_present(pte):
-                    retVal = self.get_paddr(vaddr, pte)
+                    retVal = (self.get_paddr(vaddr, pte), page_shift)
         return retVal
 
     def read_long_long_phys(self, addr):
@@ -220,37 +222,26 @@ class AMD64PagedMemory(paged.AbstractWritablePagedMemory):
         and the size of the particular page (address, size).
         It walks the 0x1000/0x8 (0x200) entries in each Page Map, 
         Page Directory, and Page Table to determine which pages
-        are accessible.
+        are accessible. Each table is read and decoded in one go.
         '''
         
-        for pml4e in range(0, 0x200):
-            vaddr = pml4e << 39
-            pml4e_value = self.get_pml4e(vaddr)
-            if not self.entry_present(pml4e_value):
-                continue
-            for pdpte in range(0, 0x200):
+        for pml4e, pml4e_value in self.table_entries(self.dtb & 0xffffffffff000, 0x200, "Q"):
+            pdpt = pml4e_value & 0xffffffffff000
+            for pdpte, pdpte_value in self.table_entries(pdpt, 0x200, "Q"):
                 vaddr = (pml4e << 39) | (pdpte << 30)
-                pdpte_value = self.get_pdpi(vaddr, pml4e_value)
-                if not self.entry_present(pdpte_value):
-                    continue
                 if self.page_size_flag(pdpte_value):
                     yield (vaddr, 0x40000000)
                     continue
 
                 pgd_curr = self.pdba_base(pdpte_value)
-                for j in range(0, ptrs_per_pae_pgd):
+                for j, entry in self.table_entries(pgd_curr, ptrs_per_pae_pgd, "Q"):
                     soffset = vaddr + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                    entry = self.read_long_long_phys(pgd_curr)
-                    pgd_curr = pgd_curr + 8
-                    if self.entry_present(entry) and self.page_size_flag(entry):
+                    if self.page_size_flag(entry):
                         yield (soffset, 0x200000)
-                    elif self.entry_present(entry):
+                    else:
                         pte_curr = entry & 0xFFFFFFFFFF000
-                        for k in range(0, ptrs_per_pae_pte):
-                            pte_entry = self.read_long_long_phys(pte_curr)
-                            pte_curr = pte_curr + 8
-                            if self.entry_present(pte_entry):
-                                yield (soffset + k * 0x1000, 0x1000)
+                        for k, _pte_entry in self.table_entries(pte_curr, ptrs_per_pae_pte, "Q"):
+                            yield (soffset + k * 0x1000, 0x1000)
 
     @classmethod
     def address_mask(cls, addr):
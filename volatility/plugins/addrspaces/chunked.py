@@ -0,0 +1,283 @@
+# Volatility
+# Copyright (C) 2007-2013 Volatility Foundation
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" An address space for chunked, compressed memory images.
+
+The image is split into fixed size chunks which are compressed with
+zlib independently, so any part of it can be read without
+decompressing what comes before.  The file layout is:
+
+  header  (0x20 bytes)  magic "VCHK", version, chunk size, flags,
+                        image size and the offset of the index
+  chunks                the compressed chunks, in order
+  index                 one (offset, length, flags) entry per chunk
+
+Chunks which are all zeros, or which were not present in the source
+address space, take no space in the file, only an index entry.
+"""
+
+import struct
+import zlib
+import volatility.obj as obj
+import volatility.addrspace as addrspace
+
+## Chunk flags
+CHUNK_STORED = 1      # Stored without compression
+CHUNK_ZERO = 2        # All zeros, no data in the file
+CHUNK_ABSENT = 4      # Not present in the source address space
+
+index_entry = struct.Struct("<QII")
+
+class ChunkedImageVTypes(obj.ProfileModification):
+    def modification(self, profile):
+        profile.vtypes.update({
+            'VCHK_HEADER' : [ 0x20, {
+                'Magic' : [ 0x0, ['String', dict(length = 4)]],
+                'Version' : [ 0x4, ['unsigned int']],
+                'ChunkSize' : [ 0x8, ['unsigned int']],
+                'Flags' : [ 0xC, ['unsigned int']],
+                'ImageSize' : [ 0x10, ['unsigned long long']],
+                'IndexOffset' : [ 0x18, ['unsigned long long']],
+                }],
+            })
+
+class ChunkCache(object):
+    """ A least recently used cache of decompressed chunks """
+    def __init__(self, limit = 64):
+        self.limit = limit
+        self.cache = {}
+        self.seq = []
+
+    def get(self, key):
+        item = self.cache[key]
+        if self.seq[-1] != key:
+            self.seq.remove(key)
+            self.seq.append(key)
+        return item
+
+    def put(self, key, item):
+        self.cache[key] = item
+        self.seq.append(key)
+        if len(self.seq) > self.limit:
+            del self.cache[self.seq.pop(0)]
+
+class ChunkedImageAddressSpace(addrspace.BaseAddressSpace):
+    """ This AS supports chunked compressed images written by imagecopy --compress """
+
+    order = 30
+    cache_chunks = 64
+
+    def __init__(self, base, config, **kwargs):
+        ## We must have an AS below us
+        self.as_assert(base, "No base Address Space")
+        addrspace.BaseAddressSpace.__init__(self, base, config, **kwargs)
+
+        self.as_assert(base.read(0, 4) == "VCHK", "Invalid chunked image signature")
+        self.as_assert(self.profile.has_type("VCHK_HEADER"), "VCHK_HEADER not available in profile")
+        self.header = obj.Object("VCHK_HEADER", offset = 0, vm = base)
+        self.as_assert(self.header.Version == 1, "Unsupported chunked image version")
+
+        self.chunk_size = int(self.header.ChunkSize)
+        self.image_size = int(self.header.ImageSize)
+        self.as_assert(self.chunk_size > 0, "Invalid chunk size")
+
+        count = (self.image_size + self.chunk_size - 1) / self.chunk_size
+        data = base.read(int(self.header.IndexOffset), count * index_entry.size)
+        self.as_assert(data and len(data) == count * index_entry.size, "Chunk index is truncated")
+
+        ## Since these are used on every read, keep them as plain tuples
+        self.index = [index_entry.unpack_from(data, i * index_entry.size) for i in range(count)]
+
+        self.chunks = ChunkCache(self.cache_chunks)
+        self.zero_chunk = "\x00" * self.chunk_size
+
+    def get_header(self):
+        return self.header
+
+    def get_base(self):
+        return self.base
+
+    def read_chunk(self, chunk):
+        """ Returns the decompressed data of a chunk, or None if the
+        chunk was not present in the source image.
+        """
+        try:
+            return self.chunks.get(chunk)
+        except KeyError:
+            pass
+
+        offset, length, flags = self.index[chunk]
+        if flags & CHUNK_ABSENT:
+            return None
+        if flags & CHUNK_ZERO:
+            return self.zero_chunk
+
+        data = self.base.read(offset, length)
+        if not data or len(data) != length:
+            return None
+        if not flags & CHUNK_STORED:
+            data = zlib.decompress(data)
+
+        self.chunks.put(chunk, data)
+        return data
+
+    def _read(self, addr, length, pad):
+        result = []
+        end = addr + length
+        while addr < end:
+            chunk, chunk_offset = divmod(addr, self.chunk_size)
+            available = min(self.chunk_size - chunk_offset, end - addr)
+
+            data = None
+            if 0 <= chunk < len(self.index):
+                data = self.read_chunk(chunk)
+            if data is None:
+                if not pad:
+                    return obj.NoneObject("Could not read chunk at " + hex(addr))
+                data = self.zero_chunk
+
+            result.append(data[chunk_offset:chunk_offset + available])
+            addr += available
+
+        return "".join(result)
+
+    def read(self, addr, length):
+        return self._read(addr, length, False)
+
+    def zread(self, addr, length):
+        data = self._read(addr, length, True)
+        ## The last chunk may be short
+        if len(data) != length:
+            data += "\x00" * (length - len(data))
+        return data
+
+    def read_long(self, addr):
+        string = self.read(addr, 4)
+        if not string:
+            return obj.NoneObject("Could not read long at " + hex(addr))
+        (longval,) = struct.unpack('=I', string)
+        return longval
+
+    def is_valid_address(self, addr):
+        if addr == None or addr < 0 or addr >= self.image_size:
+            return False
+        return not self.index[addr / self.chunk_size][2] & CHUNK_ABSENT
+
+    def get_available_addresses(self):
+        """ Returns the runs of chunks present in the source image """
+        start = None
+        for i, (_offset, _length, flags) in enumerate(self.index):
+            if flags & CHUNK_ABSENT:
+                if start is not None:
+                    yield start * self.chunk_size, (i - start) * self.chunk_size
+                    start = None
+            elif start is None:
+                start = i
+
+        if start is not None:
+            yield start * self.chunk_size, self.image_size - start * self.chunk_size
+
+    def get_address_range(self):
+        return [0, self.image_size]
+
+    def close(self):
+        self.base.close()
+
+class ChunkedImageWriter(object):
+    """ Writes a chunked compressed image.
+
+    Data is added with write(offset, data) in increasing offset order.
+    Chunks which no data was written to are recorded as absent, and
+    the index and header are written by close().
+    """
+    def __init__(self, fd, chunk_size = 0x10000, level = 6):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.level = level
+        self.index = []
+        self.buffer = None
+        self.buffer_chunk = 0
+        self.image_size = 0
+        self.zero_chunk = "\x00" * chunk_size
+        self.position = 0x20
+        ## Statistics
+        self.stored_bytes = 0
+        self.zero_chunks = 0
+
+        self.fd.seek(0)
+        self.fd.write("\x00" * 0x20)
+
+    def _flush(self):
+        if self.buffer is None:
+            return
+
+        data = str(self.buffer)
+        self.buffer = None
+        while len(self.index) < self.buffer_chunk:
+            self.index.append((0, 0, CHUNK_ABSENT))
+
+        if data == self.zero_chunk[:len(data)]:
+            self.index.append((0, 0, CHUNK_ZERO))
+            self.zero_chunks += 1
+            return
+
+        compressed = zlib.compress(data, self.level)
+        flags = 0
+        if len(compressed) >= len(data):
+            compressed = data
+            flags = CHUNK_STORED
+
+        self.fd.write(compressed)
+        self.index.append((self.position, len(compressed), flags))
+        self.position += len(compressed)
+        self.stored_bytes += len(compressed)
+
+    def write(self, offset, data):
+        position = 0
+        while position < len(data):
+            chunk, chunk_offset = divmod(offset, self.chunk_size)
+            if self.buffer is not None and chunk != self.buffer_chunk:
+                self._flush()
+            if self.buffer is None:
+                if chunk < len(self.index):
+                    raise ValueError("Chunked images must be written in order")
+                self.buffer = bytearray(self.chunk_size)
+                self.buffer_chunk = chunk
+
+            count = min(self.chunk_size - chunk_offset, len(data) - position)
+            self.buffer[chunk_offset:chunk_offset + count] = buffer(data, position, count)
+            position += count
+            offset += count
+            self.image_size = max(self.image_size, offset)
+
+    def close(self):
+        """ Writes out the last chunk, the index and the header """
+        if self.buffer is not None:
+            ## Do not pad the image past the data written
+            end = self.image_size - self.buffer_chunk * self.chunk_size
+            self.buffer = self.buffer[:end]
+        self._flush()
+
+        index_offset = self.position
+        self.fd.write("".join(index_entry.pack(*entry) for entry in self.index))
+        self.fd.seek(0)
+        self.fd.write(struct.pack("<4sIIIQQ", "VCHK", 1, self.chunk_size, 0,
+                                  self.image_size, index_offset))
+        self.fd.flush()
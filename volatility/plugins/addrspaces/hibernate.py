@@ -27,8 +27,13 @@
 """ A Hiber file Address Space """
 import volatility.addrspace as addrspace
 import volatility.obj as obj
+import volatility.cache as cache
+import volatility.debug as debug
 import volatility.win32.xpress as xpress
+import bisect
+import hashlib
 import struct
+import os
 
 
 #pylint: disable-msg=C0111
@@ -56,6 +61,74 @@ class Store(object):
     def get(self, key):
         return self.cache[key]
 
+class HiberPageStore(object):
+    """ Keeps decompressed pages of a hibernation file in a sparse file
+    in the cache directory, so that later runs need not decompress the
+    same xpress blocks again.
+
+    Each page is stored at page number * PAGE_SIZE in the data file.
+    The index file starts with a key identifying the hibernation file
+    and is followed by the offsets of the xpress blocks whose pages
+    have been stored, which are appended once the pages are written.
+    """
+    record = struct.Struct("<Q")
+
+    def __init__(self, filename, key):
+        self.data_name = filename + ".pages"
+        self.index_name = filename + ".index"
+        self.key = key
+        self.blocks = set()
+        self.pid = None
+        self.data = None
+
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        try:
+            index = open(self.index_name, "rb").read()
+        except IOError:
+            index = ""
+
+        if index[:len(key)] == key:
+            for i in range(len(key), len(index) - self.record.size + 1, self.record.size):
+                self.blocks.add(self.record.unpack_from(index, i)[0])
+        else:
+            ## A different (or no) hibernation file, start again
+            open(self.data_name, "wb").close()
+            with open(self.index_name, "wb") as fd:
+                fd.write(key)
+
+    def _handle(self):
+        # Scans may fork workers which must not share our file position
+        if self.pid != os.getpid():
+            self.data = open(self.data_name, "r+b")
+            self.pid = os.getpid()
+        return self.data
+
+    def has_block(self, block):
+        return block in self.blocks
+
+    def read(self, page, offset, length):
+        fd = self._handle()
+        fd.seek(page * PAGE_SIZE + offset)
+        return fd.read(length)
+
+    def put_block(self, block, pages, data):
+        """ Stores the decompressed data of a block, pages is a
+        list of (page number, index of the page in the block)
+        """
+        fd = self._handle()
+        for page, index in pages:
+            fd.seek(page * PAGE_SIZE)
+            fd.write(data[index * PAGE_SIZE:(index + 1) * PAGE_SIZE])
+        fd.flush()
+
+        ## Small appends are atomic, so workers can share the index
+        with open(self.index_name, "ab") as index:
+            index.write(self.record.pack(block))
+        self.blocks.add(block)
+
 class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
     """ This is a hibernate address space for windows hibernation files.
 
@@ -75,7 +148,16 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         self.PageIndex = 0
         self.AddressList = []
         self.LookupCache = {}
+        self.Tables = []
+        self.Ranges = []
+        self.RangeStarts = []
+        self.TableRanges = []
+        self.TableIndexes = []
+        self.Blocks = []
+        self.saved_blocks = 0
+        self.found_blocks = 0
         self.PageCache = Store(50)
+        self.PageStore = None
         self.MemRangeCnt = 0
         self.entry_count = 0xFF
 
@@ -102,9 +184,72 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
         ## need to search for it.
         self.dtb = self.ProcState.SpecialRegisters.Cr3.v()
 
-        # This is a lengthy process, it was cached, but it may be best to delay this
-        # until it's absolutely necessary and/or convert it into a generator...
-        self.build_page_cache()
+        # Only the memory range tables are read here, the xpress blocks
+        # holding the pages are located as the pages are first read
+        self.cache_key = self._get_cache_key()
+        if not self.load_page_cache():
+            self.build_table_index()
+            self.save_page_cache()
+
+        if cache.config.CACHE:
+            self.PageStore = self._open_page_store()
+
+    def _get_cache_key(self):
+        """ Identifies the hibernation file for the cached page map and pages """
+        digest = hashlib.md5()
+        digest.update(self.base.zread(0, PAGE_SIZE))
+        digest.update(self.base.zread(self._get_first_table_page() * PAGE_SIZE, PAGE_SIZE))
+        return digest.digest()
+
+    def load_page_cache(self):
+        """ Loads the table index and the xpress blocks found so far from the cache """
+        if not cache.config.CACHE:
+            return False
+        node = cache.CACHE["address_spaces/hiberfil/page_map"]
+        payload = node and node.get_payload()
+        if not payload or payload["key"] != self.cache_key or "Blocks" not in payload:
+            return False
+
+        self.Tables = payload["Tables"]
+        self.Ranges = payload["Ranges"]
+        self.RangeStarts = [r[0] for r in self.Ranges]
+        self.index_table_ranges()
+        self.Blocks = payload["Blocks"]
+        self.AddressList = payload["AddressList"]
+        self.HighestPage = payload["HighestPage"]
+        self.PageIndex = payload["PageIndex"]
+        self.MemRangeCnt = payload["MemRangeCnt"]
+        self.saved_blocks = self.found_blocks = sum(len(b) for b in self.Blocks)
+        return True
+
+    def save_page_cache(self):
+        ## Without --cache the node is a BlockingNode, which would still
+        ## walk the whole page map on set_payload
+        if not cache.config.CACHE:
+            return
+        node = cache.CACHE["address_spaces/hiberfil/page_map"]
+        if node is None:
+            return
+        node.set_payload(dict(key = self.cache_key,
+                              Tables = self.Tables,
+                              Ranges = self.Ranges,
+                              Blocks = self.Blocks,
+                              AddressList = self.AddressList,
+                              HighestPage = self.HighestPage,
+                              PageIndex = self.PageIndex,
+                              MemRangeCnt = self.MemRangeCnt))
+        node.dump()
+        self.saved_blocks = self.found_blocks
+
+    def _open_page_store(self):
+        filename = os.path.join(cache.config.CACHE_DIRECTORY,
+                                os.path.basename(cache.config.LOCATION) + ".cache",
+                                "hiberfil")
+        try:
+            return HiberPageStore(filename, self.cache_key)
+        except EnvironmentError, e:
+            debug.debug("Unable to use the hibernation page store {0}: {1}".format(filename, e))
+            return None
 
     def _get_first_table_page(self):
         if self.header != None:
@@ -114,20 +259,23 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
                 return i - 1
         return None
 
-    def build_page_cache(self):
-        XpressIndex = 0
-        XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER",
-                                  (self._get_first_table_page() + 1) * 4096,
-                                  self.base)
-
-        XpressBlockSize = self.get_xpress_block_size(XpressHeader)
+    def build_table_index(self):
+        """ Reads the chain of memory range tables.
 
+        Each table lists the page ranges whose pages follow it in the
+        file, 0x10 pages to an xpress block.  self.Tables holds
+        (table offset, page count) for each table and self.Ranges holds
+        (start page, end page, table number, index of the start page
+        in the table) sorted by page.
+        """
+        ranges = []
         MemoryArrayOffset = self._get_first_table_page() * 4096
 
         while MemoryArrayOffset:
             MemoryArray = obj.Object('_PO_MEMORY_RANGE_ARRAY', MemoryArrayOffset, self.base)
 
             EntryCount = MemoryArray.MemArrayLink.EntryCount.v()
+            TableIndex = 0
             for i in MemoryArray.RangeTable:
                 start = i.StartPage.v()
                 end = i.EndPage.v()
@@ -138,27 +286,13 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
                     self.HighestPage = end
 
                 self.AddressList.append((start * 0x1000, LocalPageCnt * 0x1000))
+                ranges.append((start, end, len(self.Tables), TableIndex))
 
-                for j in range(0, LocalPageCnt):
-                    if (XpressIndex and ((XpressIndex % 0x10) == 0)):
-                        XpressHeader, XpressBlockSize = \
-                                      self.next_xpress(XpressHeader, XpressBlockSize)
+                TableIndex += LocalPageCnt
+                self.PageIndex += LocalPageCnt
 
-                    PageNumber = start + j
-                    XpressPage = XpressIndex % 0x10
-                    if XpressHeader.obj_offset not in self.PageDict:
-                        self.PageDict[XpressHeader.obj_offset] = [
-                            (PageNumber, XpressBlockSize, XpressPage)]
-                    else:
-                        self.PageDict[XpressHeader.obj_offset].append(
-                            (PageNumber, XpressBlockSize, XpressPage))
-
-                    ## Update the lookup cache
-                    self.LookupCache[PageNumber] = (
-                        XpressHeader.obj_offset, XpressBlockSize, XpressPage)
-
-                    self.PageIndex += 1
-                    XpressIndex += 1
+            self.Tables.append((MemoryArrayOffset, TableIndex))
+            self.Blocks.append([])
 
             NextTable = MemoryArray.MemArrayLink.NextTable.v()
 
@@ -166,42 +300,149 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
             if (NextTable and (EntryCount == self.entry_count)):
                 MemoryArrayOffset = NextTable * 0x1000
                 self.MemRangeCnt += 1
-                XpressHeader, XpressBlockSize = \
-                                             self.next_xpress(XpressHeader, XpressBlockSize)
+            else:
+                MemoryArrayOffset = 0
 
-                # Make sure the xpress block is after the Memory Table
-                while (XpressHeader.obj_offset < MemoryArrayOffset):
-                    XpressHeader, XpressBlockSize = \
-                        self.next_xpress(XpressHeader, 0)
+        self.Ranges = []
+        self.RangeStarts = []
+        for r in ranges:
+            self._add_range(r)
+        self.index_table_ranges()
+
+    def index_table_ranges(self):
+        """ Sorts the ranges by table, so the ranges which hold the pages
+        of an xpress block can be found with bisect.
+
+        self.TableRanges holds the ranges of each table sorted by their
+        index in the table, self.TableIndexes the indexes they start at.
+        """
+        self.TableRanges = [[] for _ in self.Tables]
+        for r in self.Ranges:
+            self.TableRanges[r[2]].append(r)
+        for ranges in self.TableRanges:
+            ranges.sort(key = lambda r: r[3])
+        self.TableIndexes = [[r[3] for r in ranges] for ranges in self.TableRanges]
+
+    def _add_range(self, r):
+        """ Adds a range to self.Ranges, which is kept sorted.
+
+        Where a page is listed more than once the one listed last in
+        the file is used, so the parts of earlier ranges which r
+        covers are dropped and the rest of them is kept.
+        """
+        start, end = r[0], r[1]
+        i = bisect.bisect_right(self.RangeStarts, start)
+        if i > 0 and self.Ranges[i - 1][1] > start:
+            i -= 1
+        j = i
+        head, tail = [], []
+        while j < len(self.Ranges) and self.Ranges[j][0] < end:
+            s, e, table, index = self.Ranges[j]
+            if s < start:
+                head = [(s, start, table, index)]
+            if e > end:
+                tail = [(end, e, table, index + end - s)]
+            j += 1
+
+        pieces = head + [r] + tail
+        self.Ranges[i:j] = pieces
+        self.RangeStarts[i:j] = [p[0] for p in pieces]
 
-                XpressIndex = 0
+    def build_page_cache(self):
+        """ Locates every xpress block (rather than as they are needed) """
+        for table, (_offset, count) in enumerate(self.Tables):
+            for block in range((count + 0xF) / 0x10):
+                self._get_block(table, block)
+        if self.found_blocks > self.saved_blocks:
+            self.save_page_cache()
+
+    def _get_block(self, table, block):
+        """ Returns (header offset, block size) of an xpress block of
+        a table, locating the blocks up to it if needed.
+        """
+        blocks = self.Blocks[table]
+        while len(blocks) <= block:
+            if blocks:
+                XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER", blocks[-1][0], self.base)
+                XpressHeader, XpressBlockSize = self.next_xpress(XpressHeader, blocks[-1][1])
+            elif table == 0:
+                XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER",
+                                          (self._get_first_table_page() + 1) * 4096,
+                                          self.base)
+                XpressBlockSize = self.get_xpress_block_size(XpressHeader)
             else:
-                MemoryArrayOffset = 0
+                # The first xpress block of a table follows the table
+                XpressHeader, XpressBlockSize = self.find_xpress(self.Tables[table][0])
 
-    def next_xpress(self, XpressHeader, XpressBlockSize):
-        XpressHeaderOffset = XpressBlockSize + XpressHeader.obj_offset + \
-                             XpressHeader.size()
+            if XpressHeader is None:
+                return None
+            blocks.append((XpressHeader.obj_offset, XpressBlockSize))
 
+            ## Save what we have found now and then (each time the
+            ## number of blocks found has doubled), so later runs need
+            ## not look for the blocks again. The rest is saved on close.
+            self.found_blocks += 1
+            if self.found_blocks >= 2 * self.saved_blocks + 0x100:
+                self.save_page_cache()
+
+        return blocks[block]
+
+    def _locate_page(self, page):
+        """ Locates the xpress block holding a page and adds all the
+        pages of that block to the lookup cache.
+        """
+        i = bisect.bisect_right(self.RangeStarts, page) - 1
+        if i < 0 or page >= self.Ranges[i][1]:
+            return None
+
+        start, _end, table, index = self.Ranges[i]
+        block = (index + page - start) / 0x10
+        location = self._get_block(table, block)
+        if location is None:
+            return None
+        offset, size = location
+
+        ## The pages of the table from this block's first page on
+        first = block * 0x10
+        ranges = self.TableRanges[table]
+        pages = []
+        for i in range(max(bisect.bisect_right(self.TableIndexes[table], first) - 1, 0), len(ranges)):
+            start, end, _t, index = ranges[i]
+            if index >= first + 0x10:
+                break
+            for j in range(max(index, first), min(index + end - start, first + 0x10)):
+                pages.append((start + j - index, size, j - first))
+
+        self.PageDict[offset] = pages
+        for PageNumber, XpressBlockSize, XpressPage in pages:
+            self.LookupCache[PageNumber] = (offset, XpressBlockSize, XpressPage)
+
+        return self.LookupCache.get(page)
+
+    def find_xpress(self, offset, limit = 10240):
+        """ Returns the first xpress header at or after offset, and its
+        block size, or (None, None) if there is none within limit bytes.
+        """
         ## We only search this far
         BLOCKSIZE = 1024
-        original_offset = XpressHeaderOffset
-        while 1:
-            data = self.base.read(XpressHeaderOffset, BLOCKSIZE)
-            Magic_offset = data.find("\x81\x81xpress")
-            if Magic_offset >= 0:
-                XpressHeaderOffset += Magic_offset
+        magic = "\x81\x81xpress"
+        XpressHeaderOffset = offset
+        while XpressHeaderOffset - offset <= limit:
+            data = self.base.read(XpressHeaderOffset, BLOCKSIZE + len(magic) - 1)
+            if not data:
                 break
-            else:
-                XpressHeaderOffset += len(data)
-
-            ## Only search this far in advance
-            if XpressHeaderOffset - original_offset > 10240:
-                return None, None
+            Magic_offset = data.find(magic)
+            if Magic_offset >= 0:
+                XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER", XpressHeaderOffset + Magic_offset, self.base)
+                return XpressHeader, self.get_xpress_block_size(XpressHeader)
+            XpressHeaderOffset += BLOCKSIZE
 
-        XpressHeader = obj.Object("_IMAGE_XPRESS_HEADER", XpressHeaderOffset, self.base)
-        XpressBlockSize = self.get_xpress_block_size(XpressHeader)
+        return None, None
 
-        return XpressHeader, XpressBlockSize
+    def next_xpress(self, XpressHeader, XpressBlockSize):
+        XpressHeaderOffset = XpressBlockSize + XpressHeader.obj_offset + \
+                             XpressHeader.size()
+        return self.find_xpress(XpressHeaderOffset)
 
     def get_xpress_block_size(self, xpress_header):
         u0B = xpress_header.u0B.v() << 24
@@ -233,21 +474,24 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
     def get_addr(self, addr):
         page = addr >> page_shift
-        if page in self.LookupCache:
-            (hoffset, size, pageoffset) = self.LookupCache[page]
+        location = self.LookupCache.get(page) or self._locate_page(page)
+        if location:
+            (hoffset, size, pageoffset) = location
             return hoffset, size, pageoffset
         return None, None, None
 
     def get_block_offset(self, _xb, addr):
-        page = addr >> page_shift
-        if page in self.LookupCache:
-            (_hoffset, _size, pageoffset) = self.LookupCache[page]
-            return pageoffset
-        return None
+        _hoffset, _size, pageoffset = self.get_addr(addr)
+        return pageoffset
 
     def is_valid_address(self, addr):
-        XpressHeaderOffset, _XpressBlockSize, _XpressPage = self.get_addr(addr)
-        return XpressHeaderOffset != None
+        if addr == None:
+            return False
+        page = addr >> page_shift
+        if page in self.LookupCache:
+            return True
+        i = bisect.bisect_right(self.RangeStarts, page) - 1
+        return i >= 0 and page < self.Ranges[i][1]
 
     def read_xpress(self, baddr, BlockSize):
         try:
@@ -280,8 +524,23 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
         baddr = ImageXpressHeader + 0x20
 
+        store = self.PageStore
+        if store is not None and store.has_block(ImageXpressHeader):
+            return store.read(addr >> page_shift, page_offset, available)
+
         data = self.read_xpress(baddr, BlockSize)
 
+        if store is not None and BlockSize != 0x10000:
+            ## Only pages which are looked up in this block, in case a
+            ## page number is repeated in a later block
+            pages = [(page, index) for page, _size, index in self.PageDict[ImageXpressHeader]
+                     if self.LookupCache[page][0] == ImageXpressHeader]
+            try:
+                store.put_block(ImageXpressHeader, pages, data)
+            except EnvironmentError, e:
+                debug.debug("Unable to store hibernation pages: {0}".format(e))
+                self.PageStore = None
+
         ## Each block decompressed contains 2**page_shift pages. We
         ## need to know which page to use here.
         offset = XpressPage * 0x1000 + page_offset
@@ -320,8 +579,8 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
 
     def get_available_pages(self):
         page_list = []
-        for _i, xb in enumerate(self.PageDict.keys()):
-            for page, _size, _offset in self.PageDict[xb]:
+        for start, end, _table, _index in self.Ranges:
+            for page in range(start, end):
                 page_list.append([page * 0x1000, 0x1000])
         return page_list
 
@@ -341,5 +600,7 @@ class WindowsHiberFileSpace32(addrspace.BaseAddressSpace):
             yield i
 
     def close(self):
+        if self.found_blocks > self.saved_blocks:
+            self.save_page_cache()
         self.base.close()
 
@@ -72,6 +72,7 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
     pae = False
     paging_address_space = True
     checkname = 'IA32ValidAS'
+    page_shifts = (page_shift, pgdir_shift)
     # Hardcoded page info to avoid expensive recalculation
     minimum_size = 0x1000
     alignment_gcd = 0x1000
@@ -126,18 +127,18 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
     def get_four_meg_paddr(self, vaddr, pgd_entry):
         return (pgd_entry & ((ptrs_per_pgd - 1) << 22)) | (vaddr & ~((ptrs_per_pgd - 1) << 22))
 
-    def vtop(self, vaddr):
+    def walk(self, vaddr):
         retVal = None
         pgd = self.get_pgd(vaddr)
         if self.entry_present(pgd):
             if self.page_size_flag(pgd):
-                retVal = self.get_four_meg_paddr(vaddr, pgd)
+                retVal = (self.get_four_meg_paddr(vaddr, pgd), pgdir_shift)
             else:
                 pte = self.get_pte(vaddr, pgd)
                 if not pte:
                     return None
                 if self.entry_present(pte):
-                    retVal = self.get_paddr(vaddr, pte)
+                    retVal = (self.get_paddr(vaddr, pte), page_shift)
         return retVal
 
     def read_long_phys(self, addr):
@@ -151,20 +152,14 @@ class IA32PagedMemory(paged.AbstractWritablePagedMemory):
         return longval
 
     def get_available_pages(self):
-        pgd_curr = self.dtb
-        for i in range(0, ptrs_per_pgd):
+        for i, entry in self.table_entries(self.dtb, ptrs_per_pgd, "I"):
             start = (i * ptrs_per_pgd * ptrs_per_pte * 4)
-            entry = self.read_long_phys(pgd_curr)
-            pgd_curr = pgd_curr + 4
-            if self.entry_present(entry) and self.page_size_flag(entry):
+            if self.page_size_flag(entry):
                 yield (start, 0x400000)
-            elif self.entry_present(entry):
+            else:
                 pte_curr = entry & ~((1 << page_shift) - 1)
-                for j in range(0, ptrs_per_pte):
-                    pte_entry = self.read_long_phys(pte_curr)
-                    pte_curr = pte_curr + 4
-                    if self.entry_present(pte_entry):
-                        yield (start + j * 0x1000, 0x1000)
+                for j, _pte_entry in self.table_entries(pte_curr, ptrs_per_pte, "I"):
+                    yield (start + j * 0x1000, 0x1000)
 
 class IA32PagedMemoryPae(IA32PagedMemory):
     """
@@ -189,6 +184,7 @@ class IA32PagedMemoryPae(IA32PagedMemory):
 
     order = 60
     pae = True
+    page_shifts = (page_shift, pde_shift)
 
     def get_pdptb(self, pdpr):
         return pdpr & 0xFFFFFFE0
@@ -229,7 +225,7 @@ class IA32PagedMemoryPae(IA32PagedMemory):
     def get_large_paddr(self, vaddr, pgd_entry):
         return (pgd_entry & 0xFFE00000) | (vaddr & ~((ptrs_page - 1) << 21))
 
-    def vtop(self, vaddr):
+    def walk(self, vaddr):
         retVal = None
         pdpe = self.get_pdpi(vaddr)
 
@@ -239,11 +235,11 @@ class IA32PagedMemoryPae(IA32PagedMemory):
         pgd = self.get_pgd(vaddr, pdpe)
         if self.entry_present(pgd):
             if self.page_size_flag(pgd):
-                retVal = self.get_large_paddr(vaddr, pgd)
+                retVal = (self.get_large_paddr(vaddr, pgd), pde_shift)
             else:
                 pte = self.get_pte(vaddr, pgd)
                 if self.entry_present(pte):
-                    retVal = self.get_paddr(vaddr, pte)
+                    retVal = (self.get_paddr(vaddr, pte), page_shift)
 
         return retVal
 
@@ -261,27 +257,16 @@ class IA32PagedMemoryPae(IA32PagedMemory):
 
         pdpi_base = self.get_pdptb(self.dtb)
 
-        for i in range(0, ptrs_per_pdpi):
+        for i, pdpe in self.table_entries(pdpi_base, ptrs_per_pdpi, "Q"):
 
             start = (i * ptrs_per_pae_pgd * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-            pdpi_entry = pdpi_base + i * entry_size
-            pdpe = self._read_long_long_phys(pdpi_entry)
-
-            if not self.entry_present(pdpe):
-                continue
-
             pgd_curr = self.pdba_base(pdpe)
 
-            for j in range(0, ptrs_per_pae_pgd):
+            for j, entry in self.table_entries(pgd_curr, ptrs_per_pae_pgd, "Q"):
                 soffset = start + (j * ptrs_per_pae_pgd * ptrs_per_pae_pte * 8)
-                entry = self._read_long_long_phys(pgd_curr)
-                pgd_curr = pgd_curr + 8
-                if self.entry_present(entry) and self.page_size_flag(entry):
+                if self.page_size_flag(entry):
                     yield (soffset, 0x200000)
-                elif self.entry_present(entry):
+                else:
                     pte_curr = entry & ~((1 << page_shift) - 1)
-                    for k in range(0, ptrs_per_pae_pte):
-                        pte_entry = self._read_long_long_phys(pte_curr)
-                        pte_curr = pte_curr + 8
-                        if self.entry_present(pte_entry):
-                            yield (soffset + k * 0x1000, 0x1000)
+                    for k, _pte_entry in self.table_entries(pte_curr, ptrs_per_pae_pte, "Q"):
+                        yield (soffset + k * 0x1000, 0x1000)
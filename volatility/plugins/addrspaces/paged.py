@@ -19,6 +19,7 @@
 #
 
 #import fractions
+import struct
 import volatility.addrspace as addrspace
 import volatility.obj as obj
 
@@ -29,12 +30,21 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
     """
     checkname = "Intel"
 
+    ## The number of translations kept in the translation cache
+    tlb_size = 4096
+    ## The sizes (as shifts) of the pages which walk can return
+    page_shifts = (12,)
+
     def __init__(self, base, config, dtb = 0, skip_as_check = False, *args, **kwargs):
         ## We must be stacked on someone else:
         self.as_assert(base, "No base Address Space")
 
         addrspace.AbstractVirtualAddressSpace.__init__(self, base, config, *args, **kwargs)
 
+        self.tlb_hits = 0
+        self.tlb_misses = 0
+        self.tlb_flush()
+
         ## We can not stack on someone with a dtb
         self.as_assert(not (hasattr(base, 'paging_address_space') and base.paging_address_space), "Can not stack over another paging address space")
 
@@ -84,14 +94,86 @@ class AbstractPagedMemory(addrspace.AbstractVirtualAddressSpace):
         config.add_option("DTB", type = 'int', default = 0,
                           help = "DTB Address")
 
-    def vtop(self, addr):
-        """Abstract function that converts virtual (paged) addresses to physical addresses"""
+    def tlb_flush(self):
+        """Empties the translation cache"""
+        self._tlb = {}
+        self._tlb_old = {}
+
+    def tlb_stats(self):
+        """Returns the hits, misses and hit rate of the translation cache"""
+        lookups = self.tlb_hits + self.tlb_misses
+        return dict(hits = self.tlb_hits, misses = self.tlb_misses,
+                    entries = len(self._tlb) + len(self._tlb_old),
+                    hit_rate = float(self.tlb_hits) / lookups if lookups else 0.0)
+
+    def walk(self, addr):
+        """Abstract function that walks the page tables for a virtual
+        address, returning (physical address, page shift) or None"""
         pass
 
+    def vtop(self, addr):
+        """Converts virtual (paged) addresses to physical addresses
+
+        Translations (and addresses which do not translate) are kept
+        in a cache keyed by virtual page, for each of the page_shifts
+        sizes. The cache is a pair of generations: lookups hit in the
+        current one, or are moved up from the previous one, and the
+        previous generation is dropped once the current one is full.
+        This keeps the pages which are in use for a fraction of the
+        cost of an exact LRU.
+        """
+        addr = long(addr)
+        tlb = self._tlb
+        for shift in self.page_shifts:
+            key = ((addr >> shift) << 6) | shift
+            page = tlb.get(key)
+            if page is None:
+                page = self._tlb_old.get(key)
+                if page is None:
+                    continue
+                self._tlb_add(key, page)
+
+            self.tlb_hits += 1
+            if page < 0:
+                return None
+            return page | (addr & ((1 << shift) - 1))
+
+        self.tlb_misses += 1
+        result = self.walk(addr)
+        if not result:
+            ## Remember the small page is not mapped
+            self._tlb_add(((addr >> 12) << 6) | 12, -1)
+            return None
+
+        paddr, shift = result
+        self._tlb_add(((addr >> shift) << 6) | shift, paddr & ~((1 << shift) - 1))
+        return paddr
+
+    def _tlb_add(self, key, page):
+        if len(self._tlb) >= self.tlb_size / 2:
+            self._tlb_old = self._tlb
+            self._tlb = {}
+        self._tlb[key] = page
+
     def get_available_pages(self):
         """A generator that returns (addr, size) for each of the virtual addresses present, sorted by offset"""
         pass
 
+    def table_entries(self, table, count, entry_format):
+        """Reads a whole paging structure at once, returning the
+        (index, entry) pairs of its present entries.
+
+        Tables which can not be read have no present entries.
+        """
+        unpacker = struct.Struct("<{0}{1}".format(count, entry_format))
+        data = self.base.zread(table, unpacker.size)
+        if not data or len(data) != unpacker.size:
+            return []
+
+        present = self.entry_present
+        return [ (i, entry) for i, entry in enumerate(unpacker.unpack(data))
+                 if entry and present(entry) ]
+
     def get_available_allocs(self):
         return self.get_available_pages()
 
@@ -158,6 +240,8 @@ class AbstractWritablePagedMemory(AbstractPagedMemory):
             result = self.base.write(paddr, buf[:datalen])
             if not result:
                 return False
+            ## The page tables may have been written to
+            self.tlb_flush()
             buf = buf[datalen:]
             position += datalen
             remaining -= datalen
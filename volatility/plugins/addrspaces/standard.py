@@ -29,6 +29,7 @@ import struct
 import volatility.addrspace as addrspace
 import volatility.debug as debug #pylint: disable-msg=W0611
 import urllib
+import mmap
 import os
 
 #pylint: disable-msg=C0111
@@ -85,6 +86,15 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         self.fhandle.seek(0, 2)
         self.fsize = self.fhandle.tell()
 
+        # Regular files opened read only are served from a mapping,
+        # which saves a seek and a read call for every access
+        self.mapping = None
+        if not config.WRITE and self.fsize and os.path.isfile(self.fname):
+            try:
+                self.mapping = mmap.mmap(self.fhandle.fileno(), 0, access = mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError, OverflowError), e:
+                debug.debug("Unable to map {0}, falling back to file reads: {1}".format(self.fname, e))
+
     # Abstract Classes cannot register options, and since this checks config.WRITE in __init__, we define the option here
     @staticmethod
     def register_options(config):
@@ -97,13 +107,31 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
 
     def read(self, addr, length):
         addr, length = int(addr), int(length)
-        self.fhandle.seek(addr)
-        data = self.fhandle.read(length)
+        if self.mapping is not None and addr >= 0:
+            data = self.mapping[addr:addr + length]
+        else:
+            self.fhandle.seek(addr)
+            data = self.fhandle.read(length)
         if len(data) == 0:
             return None
         return data
 
+    def read_buffer(self, addr, length):
+        """Returns a read only buffer over the file without copying
+        the data when the file is mapped, or a string otherwise.
+
+        Like read() this returns None when addr is beyond the file.
+        """
+        addr, length = int(addr), int(length)
+        if self.mapping is None or addr < 0:
+            return self.read(addr, length)
+        if addr >= self.fsize or length <= 0:
+            return None
+        return buffer(self.mapping, addr, length)
+
     def zread(self, addr, length):
+        if self.mapping is not None and 0 <= addr and addr + length <= self.fsize:
+            return self.mapping[int(addr):int(addr + length)]
         data = self.read(addr, length)
         if data is None:
             data = "\x00" * length
@@ -127,6 +155,9 @@ class FileAddressSpace(addrspace.BaseAddressSpace):
         return 0 <= addr < self.fsize
 
     def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
         self.fhandle.close()
 
     def write(self, addr, data):
@@ -21,7 +21,9 @@
 #
 
 """ This plugin contains CORE classes used by lots of other plugins """
+import struct
 import volatility.scan as scan
+import volatility.addrspace as addrspace
 import volatility.obj as obj
 import volatility.debug as debug #pylint: disable-msg=W0611
 import volatility.commands as commands
@@ -52,6 +54,9 @@ class PoolTagCheck(scan.ScannerCheck):
         scan.ScannerCheck.__init__(self, address_space, **kwargs)
         self.tag = tag
 
+    def prefilter(self):
+        return self.tag
+
     def skip(self, data, offset):
         try:
             nextval = data.index(self.tag, offset + 1)
@@ -64,47 +69,131 @@ class PoolTagCheck(scan.ScannerCheck):
         data = self.address_space.read(offset, len(self.tag))
         return data == self.tag
 
-class CheckPoolSize(scan.ScannerCheck):
+class PoolHeaderCheck(scan.ScannerCheck):
+    """ Base class for checks on a field of the _POOL_HEADER in front
+    of a pool tag.
+
+    The field layout and pool alignment are looked up in the profile
+    once, after which the field is decoded straight from the scanned
+    data with struct. Scanners use filter_candidates to validate all
+    the candidate offsets of a block at once.
+    """
+    field = None
+
+    def __init__(self, address_space, **kwargs):
+        scan.ScannerCheck.__init__(self, address_space, **kwargs)
+
+        layout_space = addrspace.BufferAddressSpace(address_space.get_config(),
+                            data = "\x00" * address_space.profile.get_obj_size("_POOL_HEADER"))
+        layout_space.profile = address_space.profile
+        pool_hdr = obj.Object('_POOL_HEADER', vm = layout_space, offset = 0)
+
+        member = pool_hdr.m(self.field)
+        self.layout_space = layout_space
+        self.header_offset = member.obj_offset
+        ## Offset of the field relative to the pool tag
+        self.field_offset = member.obj_offset - pool_hdr.PoolTag.obj_offset
+        self.lookbehind = max(-self.field_offset, 0)
+        self.unpacker = struct.Struct(member.format_string)
+        self.start_bit = getattr(member, "start_bit", 0)
+        self.mask = (1 << getattr(member, "end_bit", self.unpacker.size * 8)) - 1
+        self.pool_alignment = obj.VolMagic(layout_space).PoolAlignment.v()
+
+    def decode(self, data, offset):
+        """Decodes the field for the tag at offset in data"""
+        (value,) = self.unpacker.unpack_from(data, offset + self.field_offset)
+        return (value & self.mask) >> self.start_bit
+
+    def test(self, value):
+        """Returns whether the decoded field value is acceptable"""
+        return False
+
+    def check(self, offset):
+        data = self.address_space.read(offset + self.field_offset, self.unpacker.size)
+        if not data or len(data) != self.unpacker.size:
+            return False
+        return self.test(self.decode(data, -self.field_offset))
+
+    def filter_candidates(self, data, base_offset, candidates):
+        """Returns the candidate offsets (relative to base_offset, the
+        start of data) which pass this check.
+        """
+        result = []
+        start = -self.field_offset
+        end = len(data) - self.unpacker.size - self.field_offset
+        for i in candidates:
+            if start <= i <= end:
+                passed = self.test(self.decode(data, i))
+            else:
+                passed = self.check(i + base_offset)
+            if passed:
+                result.append(i)
+        return result
+
+class CheckPoolSize(PoolHeaderCheck):
     """ Check pool block size """
+    field = "BlockSize"
+
     def __init__(self, address_space, condition = (lambda x: x == 8), **kwargs):
-        scan.ScannerCheck.__init__(self, address_space, **kwargs)
+        PoolHeaderCheck.__init__(self, address_space, **kwargs)
         self.condition = condition
 
-    def check(self, offset):
-        pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
-                             offset = offset - 4)
+    def test(self, value):
+        return self.condition(value * self.pool_alignment)
 
-        block_size = pool_hdr.BlockSize.v()
+class CheckPoolType(PoolHeaderCheck):
+    """ Check the pool type
 
-        pool_alignment = obj.VolMagic(self.address_space).PoolAlignment.v()
+    Which PoolType values are paged, non paged or free differs between
+    versions of Windows, so this is left to the NonPagedPool, PagedPool
+    and FreePool properties of the profile's _POOL_HEADER. They are
+    evaluated once for each possible value of the field and the results
+    kept in a table (per profile, as building it takes a moment).
+    """
+    field = "PoolType"
 
-        return self.condition(block_size * pool_alignment)
+    ## The largest field for which every value is tabulated
+    max_table_bits = 16
+
+    ## Tables of accepted values by (profile, paged, non_paged, free)
+    tables = {}
 
-class CheckPoolType(scan.ScannerCheck):
-    """ Check the pool type """
     def __init__(self, address_space, paged = False,
                  non_paged = False, free = False, **kwargs):
-        scan.ScannerCheck.__init__(self, address_space, **kwargs)
+        PoolHeaderCheck.__init__(self, address_space, **kwargs)
         self.non_paged = non_paged
         self.paged = paged
         self.free = free
 
-    def check(self, offset):
-        pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
-                             offset = offset - 4)
-
-        return ((self.non_paged and pool_hdr.NonPagedPool) or
-               (self.free and pool_hdr.FreePool) or
-               (self.paged and pool_hdr.PagedPool))
-
-class CheckPoolIndex(scan.ScannerCheck):
+        key = (address_space.profile, paged, non_paged, free)
+        if key not in self.tables:
+            bits = min((self.mask >> self.start_bit).bit_length(), self.max_table_bits)
+            self.tables[key] = [self.evaluate(value) for value in range(1 << bits)]
+        self.table = self.tables[key]
+
+    def evaluate(self, value):
+        """Returns whether a _POOL_HEADER with this PoolType is acceptable"""
+        data = bytearray(len(self.layout_space.data))
+        self.unpacker.pack_into(data, self.header_offset, (value << self.start_bit) & self.mask)
+        self.layout_space.assign_buffer(str(data))
+        pool_hdr = obj.Object('_POOL_HEADER', vm = self.layout_space, offset = 0)
+
+        return bool((self.non_paged and pool_hdr.NonPagedPool) or
+                    (self.free and pool_hdr.FreePool) or
+                    (self.paged and pool_hdr.PagedPool))
+
+    def test(self, value):
+        if value < len(self.table):
+            return self.table[value]
+        return self.evaluate(value)
+
+class CheckPoolIndex(PoolHeaderCheck):
     """ Checks the pool index """
+    field = "PoolIndex"
+
     def __init__(self, address_space, value = 0, **kwargs):
-        scan.ScannerCheck.__init__(self, address_space, **kwargs)
+        PoolHeaderCheck.__init__(self, address_space, **kwargs)
         self.value = value
 
-    def check(self, offset):
-        pool_hdr = obj.Object('_POOL_HEADER', vm = self.address_space,
-                             offset = offset - 4)
-
-        return pool_hdr.PoolIndex == self.value
+    def test(self, value):
+        return value == self.value
@@ -68,6 +68,8 @@ class ConnScan(common.AbstractWindowsCommand):
         return (profile.metadata.get('os', 'unknown') == 'windows' and
                 profile.metadata.get('major', 0) == 5)
 
+    scanner_class = PoolScanConnFast
+
     @cache.CacheDecorator("scans/connscan2")
     def calculate(self):
         ## Just grab the AS and scan it using our scanner
@@ -76,12 +78,13 @@ class ConnScan(common.AbstractWindowsCommand):
         if not self.is_valid_profile(address_space.profile):
             debug.error("This command does not support the selected profile.")
 
-        scanner = PoolScanConnFast()
-        for offset in scanner.scan(address_space):
-            ## This yields the pool offsets - we want the actual object
-            tcp_obj = obj.Object('_TCPT_OBJECT', vm = address_space,
-                                offset = offset)
-            yield tcp_obj
+        for offset in self.scanner_class().scan(address_space):
+            yield self.parse_hit(offset, address_space, None)
+
+    def parse_hit(self, offset, address_space, kernel_as): #pylint: disable-msg=W0613
+        """Returns the _TCPT_OBJECT for a scanner hit"""
+        return obj.Object('_TCPT_OBJECT', vm = address_space,
+                          offset = offset)
 
     def render_text(self, outfd, data):
         self.table_header(outfd,
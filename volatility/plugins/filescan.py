@@ -53,6 +53,11 @@ class FileScan(common.AbstractWindowsCommand):
     meta_info['os'] = 'WIN_32_XP_SP2'
     meta_info['version'] = '0.1'
 
+    ## The scanner used to find candidate allocations. Commands which
+    ## define scanner_class and parse_hit can share a single pass over
+    ## memory with other scan commands (see the multiscan plugin).
+    scanner_class = PoolScanFile
+
     # Can't be cached until self.kernel_address_space is moved entirely within calculate
     def calculate(self):
         ## Just grab the AS and scan it using our scanner
@@ -61,36 +66,41 @@ class FileScan(common.AbstractWindowsCommand):
         ## Will need the kernel AS for later:
         kernel_as = utils.load_as(self._config)
 
-        for offset in PoolScanFile().scan(address_space):
+        for offset in self.scanner_class().scan(address_space):
+            result = self.parse_hit(offset, address_space, kernel_as)
+            if result is not None:
+                yield result
 
-            pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
-                                 offset = offset)
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the result for a scanner hit, or None to discard it"""
+        pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
+                             offset = offset)
 
-            ## We work out the _FILE_OBJECT from the end of the
-            ## allocation (bottom up).
-            pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
+        ## We work out the _FILE_OBJECT from the end of the
+        ## allocation (bottom up).
+        pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
 
-            file_obj = obj.Object("_FILE_OBJECT", vm = address_space,
-                     offset = (offset + pool_obj.BlockSize * pool_alignment -
-                     common.pool_align(kernel_as, "_FILE_OBJECT", pool_alignment)),
-                     native_vm = kernel_as
-                     )
+        file_obj = obj.Object("_FILE_OBJECT", vm = address_space,
+                 offset = (offset + pool_obj.BlockSize * pool_alignment -
+                 common.pool_align(kernel_as, "_FILE_OBJECT", pool_alignment)),
+                 native_vm = kernel_as
+                 )
 
-            ## The _OBJECT_HEADER is immediately below the _FILE_OBJECT
-            object_obj = obj.Object("_OBJECT_HEADER", vm = address_space,
-                                   offset = file_obj.obj_offset -
-                                   address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
-                                   native_vm = kernel_as
-                                   )
+        ## The _OBJECT_HEADER is immediately below the _FILE_OBJECT
+        object_obj = obj.Object("_OBJECT_HEADER", vm = address_space,
+                               offset = file_obj.obj_offset -
+                               address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
+                               native_vm = kernel_as
+                               )
 
-            if object_obj.get_object_type() != "File":
-                continue
+        if object_obj.get_object_type() != "File":
+            return None
 
-            ## If the string is not reachable we skip it
-            if not file_obj.FileName.v():
-                continue
+        ## If the string is not reachable we skip it
+        if not file_obj.FileName.v():
+            return None
 
-            yield (object_obj, file_obj)
+        return (object_obj, file_obj)
 
     def render_text(self, outfd, data):
 
@@ -116,51 +126,48 @@ class PoolScanDriver(PoolScanFile):
 
 class DriverScan(FileScan):
     "Scan for driver objects _DRIVER_OBJECT "
-    def calculate(self):
-        ## Just grab the AS and scan it using our scanner
-        address_space = utils.load_as(self._config, astype = 'physical')
 
-        ## Will need the kernel AS for later:
-        kernel_as = utils.load_as(self._config)
+    scanner_class = PoolScanDriver
 
-        for offset in PoolScanDriver().scan(address_space):
-            pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
-                                 offset = offset)
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the result for a scanner hit, or None to discard it"""
+        pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
+                             offset = offset)
 
-            ## We work out the _DRIVER_OBJECT from the end of the
-            ## allocation (bottom up).
-            pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
+        ## We work out the _DRIVER_OBJECT from the end of the
+        ## allocation (bottom up).
+        pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
 
-            extension_obj = obj.Object(
-                "_DRIVER_EXTENSION", vm = address_space,
-                offset = (offset + pool_obj.BlockSize * pool_alignment -
-                          common.pool_align(kernel_as, "_DRIVER_EXTENSION", pool_alignment)),
-                native_vm = kernel_as)
+        extension_obj = obj.Object(
+            "_DRIVER_EXTENSION", vm = address_space,
+            offset = (offset + pool_obj.BlockSize * pool_alignment -
+                      common.pool_align(kernel_as, "_DRIVER_EXTENSION", pool_alignment)),
+            native_vm = kernel_as)
 
-            ## The _DRIVER_OBJECT is immediately below the _DRIVER_EXTENSION
-            driver_obj = obj.Object(
-                "_DRIVER_OBJECT", vm = address_space,
-                offset = extension_obj.obj_offset -
-                    common.pool_align(kernel_as, "_DRIVER_OBJECT", pool_alignment),
-                native_vm = kernel_as
-                )
+        ## The _DRIVER_OBJECT is immediately below the _DRIVER_EXTENSION
+        driver_obj = obj.Object(
+            "_DRIVER_OBJECT", vm = address_space,
+            offset = extension_obj.obj_offset -
+                common.pool_align(kernel_as, "_DRIVER_OBJECT", pool_alignment),
+            native_vm = kernel_as
+            )
 
-            ## The _OBJECT_HEADER is immediately below the _DRIVER_OBJECT
-            object_obj = obj.Object(
-                "_OBJECT_HEADER", vm = address_space,
-                offset = driver_obj.obj_offset -
-                address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
-                native_vm = kernel_as
-                )
+        ## The _OBJECT_HEADER is immediately below the _DRIVER_OBJECT
+        object_obj = obj.Object(
+            "_OBJECT_HEADER", vm = address_space,
+            offset = driver_obj.obj_offset -
+            address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
+            native_vm = kernel_as
+            )
 
-            ## Skip unallocated objects
-            #if object_obj.Type == 0xbad0b0b0:
-            #    continue
+        ## Skip unallocated objects
+        #if object_obj.Type == 0xbad0b0b0:
+        #    return None
 
-            if object_obj.get_object_type() != "Driver":
-                continue
+        if object_obj.get_object_type() != "Driver":
+            return None
 
-            yield (object_obj, driver_obj, extension_obj)
+        return (object_obj, driver_obj, extension_obj)
 
 
     def render_text(self, outfd, data):
@@ -198,38 +205,35 @@ class PoolScanSymlink(PoolScanFile):
 
 class SymLinkScan(FileScan):
     "Scan for symbolic link objects "
-    def calculate(self):
-        ## Just grab the AS and scan it using our scanner
-        address_space = utils.load_as(self._config, astype = 'physical')
 
-        ## Will need the kernel AS for later:
-        kernel_as = utils.load_as(self._config)
+    scanner_class = PoolScanSymlink
 
-        for offset in PoolScanSymlink().scan(address_space):
-            pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
-                                 offset = offset)
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the result for a scanner hit, or None to discard it"""
+        pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
+                             offset = offset)
 
-            ## We work out the object from the end of the
-            ## allocation (bottom up).
-            pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
+        ## We work out the object from the end of the
+        ## allocation (bottom up).
+        pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
 
-            link_obj = obj.Object("_OBJECT_SYMBOLIC_LINK", vm = address_space,
-                     offset = (offset + pool_obj.BlockSize * pool_alignment -
-                               common.pool_align(kernel_as, "_OBJECT_SYMBOLIC_LINK", pool_alignment)),
-                     native_vm = kernel_as)
+        link_obj = obj.Object("_OBJECT_SYMBOLIC_LINK", vm = address_space,
+                 offset = (offset + pool_obj.BlockSize * pool_alignment -
+                           common.pool_align(kernel_as, "_OBJECT_SYMBOLIC_LINK", pool_alignment)),
+                 native_vm = kernel_as)
 
-            ## The _OBJECT_HEADER is immediately below the _OBJECT_SYMBOLIC_LINK
-            object_obj = obj.Object(
-                "_OBJECT_HEADER", vm = address_space,
-                offset = link_obj.obj_offset -
-                address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
-                native_vm = kernel_as
-                )
+        ## The _OBJECT_HEADER is immediately below the _OBJECT_SYMBOLIC_LINK
+        object_obj = obj.Object(
+            "_OBJECT_HEADER", vm = address_space,
+            offset = link_obj.obj_offset -
+            address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
+            native_vm = kernel_as
+            )
 
-            if object_obj.get_object_type() != "SymbolicLink":
-                continue
+        if object_obj.get_object_type() != "SymbolicLink":
+            return None
 
-            yield object_obj, link_obj
+        return object_obj, link_obj
 
     def render_text(self, outfd, data):
         """ Renders text-based output """
@@ -265,47 +269,43 @@ class MutantScan(FileScan):
         config.add_option("SILENT", short_option = 's', default = False,
                           action = 'store_true', help = 'Suppress less meaningful results')
 
-    def calculate(self):
-        ## Just grab the AS and scan it using our scanner
-        address_space = utils.load_as(self._config, astype = 'physical')
+    scanner_class = PoolScanMutant
 
-        ## Will need the kernel AS for later:
-        kernel_as = utils.load_as(self._config)
-
-        for offset in PoolScanMutant().scan(address_space):
-            pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
-                                 offset = offset)
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the result for a scanner hit, or None to discard it"""
+        pool_obj = obj.Object("_POOL_HEADER", vm = address_space,
+                             offset = offset)
 
-            ## We work out the _DRIVER_OBJECT from the end of the
-            ## allocation (bottom up).
-            pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
+        ## We work out the _DRIVER_OBJECT from the end of the
+        ## allocation (bottom up).
+        pool_alignment = obj.VolMagic(address_space).PoolAlignment.v()
 
-            mutant = obj.Object(
-                "_KMUTANT", vm = address_space,
-                offset = (offset + pool_obj.BlockSize * pool_alignment -
-                          common.pool_align(kernel_as, "_KMUTANT", pool_alignment)),
-                native_vm = kernel_as)
+        mutant = obj.Object(
+            "_KMUTANT", vm = address_space,
+            offset = (offset + pool_obj.BlockSize * pool_alignment -
+                      common.pool_align(kernel_as, "_KMUTANT", pool_alignment)),
+            native_vm = kernel_as)
 
-            ## The _OBJECT_HEADER is immediately below the _KMUTANT
-            object_obj = obj.Object(
-                "_OBJECT_HEADER", vm = address_space,
-                offset = mutant.obj_offset -
-                address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
-                native_vm = kernel_as
-                )
+        ## The _OBJECT_HEADER is immediately below the _KMUTANT
+        object_obj = obj.Object(
+            "_OBJECT_HEADER", vm = address_space,
+            offset = mutant.obj_offset -
+            address_space.profile.get_obj_offset('_OBJECT_HEADER', 'Body'),
+            native_vm = kernel_as
+            )
 
-            if object_obj.get_object_type() != "Mutant":
-                continue
+        if object_obj.get_object_type() != "Mutant":
+            return None
 
-            ## Skip unallocated objects
-            ##if object_obj.Type == 0xbad0b0b0:
-            ##   continue
+        ## Skip unallocated objects
+        ##if object_obj.Type == 0xbad0b0b0:
+        ##   return None
 
-            if self._config.SILENT:
-                if len(object_obj.NameInfo.Name) == 0:
-                    continue
+        if self._config.SILENT:
+            if len(object_obj.NameInfo.Name) == 0:
+                return None
 
-            yield (object_obj, mutant)
+        return (object_obj, mutant)
 
 
     def render_text(self, outfd, data):
@@ -416,6 +416,8 @@ class PSScan(common.AbstractWindowsCommand):
     meta_info['os'] = ['Win7SP0x86', 'WinXPSP3x86']
     meta_info['version'] = '0.1'
 
+    scanner_class = PoolScanProcess
+
     # Can't be cached until self.kernel_address_space is moved entirely
     # within calculate
     def calculate(self):
@@ -423,10 +425,13 @@ class PSScan(common.AbstractWindowsCommand):
         address_space = utils.load_as(self._config, astype = 'physical')
         kernel_as = utils.load_as(self._config)
 
-        for offset in PoolScanProcess().scan(address_space):
-            eprocess = obj.Object('_EPROCESS', vm = address_space,
-                                  native_vm = kernel_as, offset = offset)
-            yield eprocess
+        for offset in self.scanner_class().scan(address_space):
+            yield self.parse_hit(offset, address_space, kernel_as)
+
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the _EPROCESS for a scanner hit"""
+        return obj.Object('_EPROCESS', vm = address_space,
+                          native_vm = kernel_as, offset = offset)
 
 
     def render_text(self, outfd, data):
@@ -58,6 +58,10 @@ class PoolScanWind(scan.PoolScanner):
 class WndScan(filescan.FileScan, sessions.SessionsMixin):
     """Pool scanner for tagWINDOWSTATION (window stations)"""
 
+    ## Each hit produces several results, so this command
+    ## can not share its scan with multiscan
+    scanner_class = None
+
     def calculate(self):
         flat_space = utils.load_as(self._config, astype = 'physical')
         kernel_space = utils.load_as(self._config)
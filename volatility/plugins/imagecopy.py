@@ -21,12 +21,102 @@
 #
 
 import os
+import time
+import Queue
+import threading
 import volatility.debug as debug
 import volatility.utils as utils
 import volatility.plugins.common as common
+import volatility.plugins.addrspaces.chunked as chunked
+
+class SparseFile(object):
+    """Writes blocks to a file, leaving holes where the data is all zeros"""
+
+    hole_size = 0x10000
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.size = 0
+        self.zero_bytes = 0
+        self.zero_block = "\x00" * self.hole_size
+
+    def write(self, offset, data):
+        ## Gather the runs of non zero pieces and write each run at once
+        start = None
+        for pos in range(0, len(data), self.hole_size):
+            length = min(self.hole_size, len(data) - pos)
+            zero = self.zero_block if length == self.hole_size else self.zero_block[:length]
+            if data.startswith(zero, pos):
+                self.zero_bytes += length
+                if start is not None:
+                    self.fd.seek(offset + start)
+                    self.fd.write(buffer(data, start, pos - start))
+                    start = None
+            elif start is None:
+                start = pos
+
+        if start is not None:
+            self.fd.seek(offset + start)
+            self.fd.write(buffer(data, start))
+
+        self.size = max(self.size, offset + len(data))
+
+    def close(self):
+        ## Extend the file over any trailing hole
+        self.fd.seek(0, 2)
+        if self.fd.tell() < self.size:
+            self.fd.truncate(self.size)
+        self.fd.flush()
+
+class PipelinedWriter(object):
+    """Passes blocks to a writer (anything with write(offset, data) and
+    close()) from a background thread, so that reading the next block
+    overlaps writing the last one.  At most queue_size blocks wait.
+    """
+    def __init__(self, writer, queue_size = 4):
+        self.writer = writer
+        self.queue = Queue.Queue(queue_size)
+        self.error = None
+        self.stopped = False
+        self.thread = threading.Thread(target = self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None and not self.stopped:
+                try:
+                    self.writer.write(*item)
+                except Exception, e:
+                    self.error = e
+
+    def write(self, offset, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((offset, data))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        self.writer.close()
+
+    def stop(self):
+        """Stops the thread, dropping any blocks still queued, without
+        closing the writer or raising its error.  Once this returns
+        nothing more is written, so the file can be closed.
+        """
+        if self.thread.is_alive():
+            self.stopped = True
+            self.queue.put(None)
+            self.thread.join()
 
 class ImageCopy(common.AbstractWindowsCommand):
-    """Copies a physical address space out as a raw DD image"""
+    """Copies a physical address space out as a raw DD image or a compressed chunked image"""
 
     def __init__(self, *args, **kwargs):
         common.AbstractWindowsCommand.__init__(self, *args, **kwargs)
@@ -36,6 +126,9 @@ class ImageCopy(common.AbstractWindowsCommand):
         self._config.add_option("OUTPUT-IMAGE", short_option = "O", default = None,
                                 help = "Writes a raw DD image out to OUTPUT-IMAGE",
                                 action = 'store', type = 'str')
+        self._config.add_option("COMPRESS", short_option = "z", default = False,
+                                help = "Write a chunked compressed image instead of a raw image",
+                                action = 'store_true')
 
     def calculate(self):
         blocksize = self._config.BLOCKSIZE
@@ -62,19 +155,45 @@ class ImageCopy(common.AbstractWindowsCommand):
 
         outfd.write("Writing data (" + self.human_readable(self._config.BLOCKSIZE) + " chunks): |")
         f = file(self._config.OUTPUT_IMAGE, "wb+")
+        if self._config.COMPRESS:
+            target = chunked.ChunkedImageWriter(f)
+        else:
+            target = SparseFile(f)
+        writer = PipelinedWriter(target)
         progress = 0
+        total = 0
+        start = time.time()
         try:
             for o, block in data:
-                f.seek(o)
-                f.write(block)
-                f.flush()
+                if not isinstance(block, str):
+                    raise TypeError("No data read at offset {0:#x}".format(o))
+                writer.write(o, block)
                 outfd.write(".")
                 outfd.flush()
                 progress = o
+                total += len(block)
+            writer.close()
         except TypeError:
             debug.error("Error when reading from address space")
         except BaseException, e:
             debug.error("Unexpected error ({1}) during copy, recorded data up to offset {0:0x}".format(progress, str(e)))
         finally:
+            ## The thread may still be writing when the copy failed
+            writer.stop()
             f.close()
         outfd.write("|\n")
+
+        elapsed = max(time.time() - start, 0.001)
+        if self._config.COMPRESS:
+            skipped = "{0} zero chunks elided, {1} stored".format(target.zero_chunks,
+                                                                  self.human_readable(target.stored_bytes))
+        else:
+            skipped = "{0} left as holes".format(self.human_readable(target.zero_bytes))
+        outfd.write("Copied {0} in {1:.1f}s ({2}/s), {3}\n".format(self.human_readable(total), elapsed,
+                                                                   self.human_readable(total / elapsed), skipped))
+
+        self.finish_image()
+
+    def finish_image(self):
+        """Called once the image has been written and closed"""
+        pass
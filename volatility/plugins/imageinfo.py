@@ -20,15 +20,157 @@
 # along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import struct
 import volatility.win32.tasks as tasks
 import volatility.timefmt as timefmt
 import volatility.utils as utils
 import volatility.debug as debug
 import volatility.obj as obj
 import volatility.cache as cache
+import volatility.scan as scan
+import volatility.addrspace as addrspace
 import volatility.registry as registry
+import volatility.exceptions as exceptions
 import volatility.plugins.kdbgscan as kdbgscan
 
+class ProfileMatch(object):
+    """The evidence found for one profile"""
+
+    ## The tests a profile is put through, in order
+    tests = ["KDBG header", "DTB", "Address space", "KDBG address", "Process list"]
+
+    def __init__(self, profile, kdbg_offset):
+        self.profile = profile
+        self.kdbg_offset = kdbg_offset
+        self.passed = []
+        self.addr_space = None
+        self.dtb = None
+        self.kdbg = None
+
+    @property
+    def confidence(self):
+        return float(len(self.passed)) / len(self.tests)
+
+class ProfileDetector(object):
+    """Finds the windows profiles which fit an image.
+
+    The KDBG headers of all the profiles are searched for in a single
+    scan of the physical address space, which is only stacked once.
+    The profiles whose header is found are tried against that space:
+    the DTBs for all of them are found in one pass, the paging address
+    space is stacked on the physical one and the KDBG is followed
+    through it. The scan stops at the first KDBG which passes all
+    the tests.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self.headers = kdbgscan.KDBGScan.kdbg_headers(config)
+        self.physical = utils.load_as(config, astype = 'physical')
+        self.dtbs = {}
+        self.matches = {}
+
+    def profile(self, name):
+        """Returns a buffer address space using the named profile"""
+        buf = addrspace.BufferAddressSpace(self._config)
+        buf.profile = buf._set_profile(name)
+        return buf
+
+    def find_dtbs(self, profiles):
+        """Finds the DTBs (from the Idle process) of several profiles
+        with a single pass over the physical address space."""
+        profiles = [ p for p in profiles if p not in self.dtbs ]
+        if not profiles:
+            return
+
+        signatures = {}
+        for p in profiles:
+            self.dtbs[p] = None
+            buf = self.profile(p)
+            signatures.setdefault(str(obj.VolMagic(buf).DTBSignature), []).append(buf)
+
+        for block_offset, data, length, _lead in scan.read_blocks(self.physical, overlap = 4):
+            for signature, bufs in signatures.items():
+                for i in scan.find_all(data, signature, length):
+                    for buf in bufs:
+                        name = buf.profile.__class__.__name__
+                        if self.dtbs[name] is not None:
+                            continue
+                        size = buf.profile.get_obj_size("_EPROCESS")
+                        buf.assign_buffer(self.physical.zread(block_offset + i, size), block_offset + i)
+                        proc = obj.Object("_EPROCESS", offset = block_offset + i, vm = buf)
+                        if 'Idle' in proc.ImageFileName.v():
+                            self.dtbs[name] = proc.Pcb.DirectoryTableBase.v()
+
+            if None not in [self.dtbs[p] for p in profiles]:
+                break
+
+    def evaluate(self, name, kdbg_offset, profiles):
+        """Tests a profile against the KDBG at a physical offset"""
+        match = ProfileMatch(name, kdbg_offset)
+        match.passed.append("KDBG header")
+
+        self.find_dtbs(profiles)
+        match.dtb = self.dtbs[name]
+        if not match.dtb:
+            return match
+        match.passed.append("DTB")
+
+        origprofile, origdtb = self._config.PROFILE, self._config.DTB
+        try:
+            self._config.update('PROFILE', name)
+            self._config.update('DTB', match.dtb)
+            match.addr_space = utils.load_as(self._config, base_as = self.physical)
+        except exceptions.AddrSpaceError, e:
+            debug.debug("Profile {0} failed: {1}".format(name, e))
+            return match
+        finally:
+            self._config.update('PROFILE', origprofile)
+            self._config.update('DTB', origdtb)
+        match.passed.append("Address space")
+
+        ## The KDBG is on the debugger data list, the head of which
+        ## points back at it
+        addr_space = match.addr_space
+        mask = (1 << (addr_space.profile.get_obj_size("address") * 8)) - 1
+        head = struct.unpack("<Q", self.physical.zread(kdbg_offset, 8))[0] & mask
+        kdbg = struct.unpack("<Q", addr_space.zread(head, 8))[0] & mask
+        if not kdbg or addr_space.vtop(kdbg) != kdbg_offset:
+            return match
+        match.kdbg = kdbg
+        match.passed.append("KDBG address")
+
+        kdbg = obj.Object("_KDDEBUGGER_DATA64", offset = kdbg, vm = addr_space)
+        try:
+            for proc in kdbg.processes():
+                if proc.UniqueProcessId.is_valid():
+                    match.passed.append("Process list")
+                break
+        except AttributeError:
+            pass
+
+        return match
+
+    def detect(self):
+        """Returns the ProfileMatches found, best first"""
+        scanner = kdbgscan.KDBGScanner(needles = self.headers.values())
+        maxlen = max([len(h) for h in self.headers.values()])
+
+        for offset in scanner.scan(self.physical):
+            data = self.physical.zread(offset, maxlen + 0x10)
+            profiles = [ p for p, h in self.headers.items() if data.find(h) >= 0 ]
+
+            for p in profiles:
+                debug.debug("Trying profile {0} with KDBG at {1:#x}".format(p, offset))
+                match = self.evaluate(p, offset, profiles)
+                if p not in self.matches or match.confidence > self.matches[p].confidence:
+                    self.matches[p] = match
+
+            if [ m for m in self.matches.values() if m.confidence == 1 ]:
+                break
+
+        return sorted(self.matches.values(), key = lambda m: m.confidence, reverse = True)
+
 class ImageInfo(kdbgscan.KDBGScan):
     """ Identify information for the image """
     def render_text(self, outfd, data):
@@ -42,29 +184,41 @@ class ImageInfo(kdbgscan.KDBGScan):
         print "Determining profile based on KDBG search...\n"
         profilelist = [ p.__name__ for p in registry.get_plugin_classes(obj.Profile).values() ]
 
+        # Save the original profile and configuration
+        origprofile = self._config.PROFILE
+        origdtb, origkdbg = self._config.DTB, self._config.KDBG
+
+        matches = ProfileDetector(self._config).detect()
+
         bestguess = None
-        suglist = [ s for s, _ in kdbgscan.KDBGScan.calculate(self)]
-        if suglist:
-            bestguess = suglist[0]
-        suggestion = ", ".join(set(suglist))
-
-        # Set our suggested profile first, then run through the list
-        if bestguess in profilelist:
-            profilelist = [bestguess] + profilelist
+        suggestion = ", ".join([m.profile for m in matches])
+        if matches:
+            bestguess = matches[0].profile
+            # Force the user provided profile over others which fit as well
+            for m in matches:
+                if m.profile == origprofile and m.confidence == matches[0].confidence:
+                    bestguess = origprofile
+
         chosen = 'no profile'
+        match = [ m for m in matches if m.profile == bestguess and m.addr_space ]
+        if match:
+            chosen = bestguess
+            addr_space = match[0].addr_space
+            self._config.update('PROFILE', chosen)
+            self._config.update('DTB', match[0].dtb)
+            if match[0].kdbg:
+                self._config.update('KDBG', match[0].kdbg)
+        else:
+            # Not a windows image (or no KDBG could be used), try each profile in turn
+            profilelist = [origprofile] + profilelist
 
-        # Save the original profile
-        origprofile = self._config.PROFILE
-        # Force user provided profile over others
-        profilelist = [origprofile] + profilelist
-
-        for profile in profilelist:
-            debug.debug('Trying profile ' + profile)
-            self._config.update('PROFILE', profile)
-            addr_space = utils.load_as(self._config, astype = 'any')
-            if hasattr(addr_space, "dtb"):
-                chosen = profile
-                break
+            for profile in profilelist:
+                debug.debug('Trying profile ' + profile)
+                self._config.update('PROFILE', profile)
+                addr_space = utils.load_as(self._config, astype = 'any')
+                if hasattr(addr_space, "dtb"):
+                    chosen = profile
+                    break
 
         if bestguess != chosen:
             if not suggestion:
@@ -73,6 +227,9 @@ class ImageInfo(kdbgscan.KDBGScan):
 
         yield ('Suggested Profile(s)', suggestion)
 
+        if matches:
+            yield ('Profile confidence', ", ".join(["{0} ({1:.0%})".format(m.profile, m.confidence) for m in matches]))
+
         tmpas = addr_space
         count = 0
         while tmpas:
@@ -112,6 +269,8 @@ class ImageInfo(kdbgscan.KDBGScan):
 
         # Make sure to reset the profile to its original value to keep the invalidator from blocking the cache
         self._config.update('PROFILE', origprofile)
+        self._config.update('DTB', origdtb)
+        self._config.update('KDBG', origkdbg)
 
     def get_image_time(self, addr_space):
         """Get the Image Datetime"""
@@ -20,6 +20,7 @@
 # along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import re
 import volatility.obj as obj
 import volatility.scan as scan
 import volatility.cache as cache
@@ -50,6 +51,9 @@ class MultiStringFinderCheck(scan.ScannerCheck):
                 return True
         return False
 
+    def prefilter(self):
+        return self.needles
+
     def skip(self, data, offset):
         nextval = len(data)
         for needle in self.needles:
@@ -60,6 +64,15 @@ class MultiStringFinderCheck(scan.ScannerCheck):
 
 class MultiPrefixFinderCheck(MultiStringFinderCheck):
     """ Checks for multiple strings per page, finishing at the offset """
+
+    @property
+    def lookbehind(self):
+        return self.maxlen
+
+    def prefilter(self):
+        ## The offset is just after one of the needles
+        return re.compile("|".join(["(?<=" + re.escape(n) + ")" for n in self.needles]))
+
     def check(self, offset):
         verify = self.address_space.read(offset - self.maxlen, self.maxlen)
         for match in self.needles:
@@ -82,15 +95,13 @@ class KDBGScanner(scan.BaseScanner):
                         ("MultiStringFinderCheck", {'needles':oses})]
         scan.BaseScanner.__init__(self, window_size)
 
-    def scan(self, address_space, offset = 0, maxlen = None):
-        for offset in scan.BaseScanner.scan(self, address_space, offset, maxlen):
-            # Compensate for KDBG appearing within the searched for structure
-            # (0x10 should really be the offset of OwnerTag from with the structure,
-            #  however we don't know which profile to read it from, so it's hardwired)
-            # NOTE: this will not work correctly for _KDDEBUGGER_DATA32 structures
-            #       however they're only necessary for NT or older
-            offset = offset - 0x10
-            yield offset
+    def object_offset(self, found, address_space): #pylint: disable-msg=W0613
+        # Compensate for KDBG appearing within the searched for structure
+        # (0x10 should really be the offset of OwnerTag from with the structure,
+        #  however we don't know which profile to read it from, so it's hardwired)
+        # NOTE: this will not work correctly for _KDDEBUGGER_DATA32 structures
+        #       however they're only necessary for NT or older
+        return found - 0x10
 
 class KDBGScan(common.AbstractWindowsCommand):
     """Search for and dump potential KDBG values"""
@@ -100,21 +111,27 @@ class KDBGScan(common.AbstractWindowsCommand):
         config.add_option('KDBG', short_option = 'g', default = None, type = 'int',
                           help = "Specify a specific KDBG virtual address")
 
-    @cache.CacheDecorator(lambda self: "tests/kdbgscan/kdbg={0}".format(self._config.KDBG))
-    def calculate(self):
-        """Determines the address space"""
+    @staticmethod
+    def kdbg_headers(config):
+        """Returns a dictionary of the KDBGHeader of each windows profile"""
         profilelist = [ p.__name__ for p in registry.get_plugin_classes(obj.Profile).values() ]
 
         proflens = {}
-        maxlen = 0
-        origprofile = self._config.PROFILE
+        origprofile = config.PROFILE
         for p in profilelist:
-            self._config.update('PROFILE', p)
-            buf = addrspace.BufferAddressSpace(self._config)
+            config.update('PROFILE', p)
+            buf = addrspace.BufferAddressSpace(config)
             if buf.profile.metadata.get('os', 'unknown') == 'windows':
                 proflens[p] = str(obj.VolMagic(buf).KDBGHeader)
-                maxlen = max(maxlen, len(proflens[p]))
-        self._config.update('PROFILE', origprofile)
+        config.update('PROFILE', origprofile)
+
+        return proflens
+
+    @cache.CacheDecorator(lambda self: "tests/kdbgscan/kdbg={0}".format(self._config.KDBG))
+    def calculate(self):
+        """Determines the address space"""
+        proflens = self.kdbg_headers(self._config)
+        maxlen = max([len(h) for h in proflens.values()] or [0])
 
         scanner = KDBGScanner(needles = proflens.values())
 
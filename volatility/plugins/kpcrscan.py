@@ -116,6 +116,9 @@ class KPCRScan(common.AbstractWindowsCommand):
 
 class KPCRScannerCheck(scan.ScannerCheck):
     """Checks the self referential pointers to find KPCRs"""
+
+    ## The KPCR found is kept in self.KPCR
+    stateless = False
     def __init__(self, address_space):
         scan.ScannerCheck.__init__(self, address_space)
         kpcr = obj.Object("_KPCR", vm = self.address_space, offset = 0)
@@ -153,23 +156,32 @@ class KPCRScannerCheck(scan.ScannerCheck):
 
         return False
 
-    # make the scan DWORD aligned
     def skip(self, data, offset):
-        return 4
-
-        offset_string = struct.pack("I", offset)
-
-        new_offset = offset
-        ## A successful match will need to at least match the Most
-        ## Significant 3 bytes
-        while (new_offset + self.SelfPcr_offset) & 0xFF >= self.SelfPcr_offset:
-            new_offset = data.find(offset_string[3], new_offset + 1)
-            ## Its not there, skip the whole buffer
-            if new_offset < 0:
-                return len(data) - offset
-
-            if (new_offset % 4) == 0:
-                return new_offset - self.SelfPcr_offset - 1
+        """ Skips to the next DWORD aligned offset at which the SelfPcr
+        pointer could refer to the offset itself.
+
+        The two most significant bytes of the (low DWORD of the)
+        pointer must equal those of its address, and they only change
+        every 64k, so each 64k region is searched for its own two byte
+        value with str.find.
+        """
+        base = self.address_space.base_offset
+        pointer_offset = self.SelfPcr_offset + 2
+
+        i = offset + 1
+        while i < len(data):
+            address = (base + i) & 0xFFFFFFFF
+            region_end = i + 0x10000 - (address & 0xFFFF)
+            msb = struct.pack("<I", address)[2:]
+
+            found = data.find(msb, i + pointer_offset, region_end + pointer_offset + 1)
+            while found >= 0:
+                candidate = found - pointer_offset
+                if (base + candidate) % 4 == 0:
+                    return candidate - offset
+                found = data.find(msb, found + 1, region_end + pointer_offset + 1)
+
+            i = region_end
 
         return len(data) - offset
 
@@ -32,6 +32,7 @@ import volatility.plugins.taskmods as taskmods
 import volatility.plugins.vadinfo as vadinfo
 import volatility.plugins.overlays.windows.windows as windows
 import volatility.constants as constants
+import volatility.scan as scan
 
 try:
     import yara
@@ -280,6 +281,13 @@ class BaseYaraScanner(object):
     """An address space scanner for Yara signatures."""
     overlap = 1024
 
+    ## Blocks which only hold zeros (which is also what zread returns
+    ## for unavailable pages) are not handed to yara. Other blocks are
+    ## matched whole, so rules which refer to offsets in the block
+    ## still work. Signatures which match runs of zeros need this
+    ## disabled.
+    skip_zero_pages = True
+
     def __init__(self, address_space = None, rules = None):
         self.rules = rules
         self.address_space = address_space
@@ -292,7 +300,7 @@ class BaseYaraScanner(object):
             # Read some data and match it.
             to_read = min(constants.SCAN_BLOCKSIZE + self.overlap, offset + maxlen - i)
             data = self.address_space.zread(i, to_read)
-            if data:
+            if data and (not self.skip_zero_pages or any(scan.data_runs(data))):
                 for match in self.rules.match(data = data):
                     # We currently don't use name or value from the 
                     # yara results but they can be yielded in the 
@@ -185,9 +185,8 @@ class MBRScanner(scan.BaseScanner):
         self.checks = [ ("MultiStringFinderCheck", {'needles':needles})]
         scan.BaseScanner.__init__(self, window_size)
 
-    def scan(self, address_space, offset = 0, maxlen = None):
-        for offset in scan.BaseScanner.scan(self, address_space, offset, maxlen):
-            yield offset - 0x1fe
+    def object_offset(self, found, address_space): #pylint: disable-msg=W0613
+        return found - 0x1fe
 
 class MBRParser(commands.Command):
     """ Scans for and parses potential Master Boot Records (MBRs) """
@@ -510,10 +510,6 @@ class MFTScanner(scan.BaseScanner):
         self.checks = [ ("MultiStringFinderCheck", {'needles':needles})]
         scan.BaseScanner.__init__(self) 
 
-    def scan(self, address_space, offset = 0, maxlen = None):
-        for offset in scan.BaseScanner.scan(self, address_space, offset, maxlen):
-            yield offset
-
 
 class MFTParser(common.AbstractWindowsCommand):
     """ Scans for and parses potential MFT entries """
@@ -33,7 +33,6 @@ This module implements the fast module scanning
 import common
 import volatility.plugins.filescan as filescan
 import volatility.scan as scan
-import volatility.utils as utils
 import volatility.obj as obj
 import volatility.debug as debug #pylint: disable-msg=W0611
 
@@ -64,18 +63,12 @@ class ModScan(filescan.FileScan):
         version = '1.0',
         )
 
-    def calculate(self):
-        ## Here we scan the physical address space
-        address_space = utils.load_as(self._config, astype = 'physical')
+    scanner_class = PoolScanModuleFast
 
-        ## We need the kernel_address_space later
-        kernel_as = utils.load_as(self._config)
-
-        scanner = PoolScanModuleFast()
-        for offset in scanner.scan(address_space):
-            ldr_entry = obj.Object('_LDR_DATA_TABLE_ENTRY', vm = address_space,
-                                  offset = offset, native_vm = kernel_as)
-            yield ldr_entry
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the _LDR_DATA_TABLE_ENTRY for a scanner hit"""
+        return obj.Object('_LDR_DATA_TABLE_ENTRY', vm = address_space,
+                          offset = offset, native_vm = kernel_as)
 
     def render_text(self, outfd, data):
         self.table_header(outfd,
@@ -165,17 +158,13 @@ class PoolScanThreadFast(scan.PoolScanner):
 
 class ThrdScan(ModScan):
     """Scan physical memory for _ETHREAD objects"""
-    def calculate(self):
-        ## Here we scan the physical address space
-        address_space = utils.load_as(self._config, astype = 'physical')
-        kernel_as = utils.load_as(self._config)
 
-        scanner = PoolScanThreadFast()
-        for found in scanner.scan(address_space):
-            thread = obj.Object('_ETHREAD', vm = address_space,
-                               native_vm = kernel_as, offset = found)
+    scanner_class = PoolScanThreadFast
 
-            yield thread
+    def parse_hit(self, offset, address_space, kernel_as):
+        """Returns the _ETHREAD for a scanner hit"""
+        return obj.Object('_ETHREAD', vm = address_space,
+                          native_vm = kernel_as, offset = offset)
 
     def render_text(self, outfd, data):
         self.table_header(outfd,
@@ -0,0 +1,101 @@
+# Volatility
+# Copyright (C) 2007-2013 Volatility Foundation
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+@license:      GNU General Public License 2.0
+@contact:      awalters@4tphi.net
+@organization: Volatility Foundation
+"""
+
+import volatility.scan as scan
+import volatility.utils as utils
+import volatility.debug as debug
+import volatility.registry as registry
+import volatility.commands as commands
+import volatility.plugins.common as common
+
+def scan_commands():
+    """Returns the scan commands which can share a pass over memory.
+
+    A command opts in by defining a scanner_class attribute (the
+    scanner it uses) and a parse_hit(offset, address_space, kernel_as)
+    method which turns a hit into one of its results (or None).
+    The scanner_class must be set in the class itself: commands which
+    derive from a scan command (and often render something else) are
+    not included unless they set it again.
+    """
+    result = {}
+    for name, cls in registry.get_plugin_classes(commands.Command, lower = True).items():
+        if cls.__dict__.get("scanner_class") and hasattr(cls, "parse_hit"):
+            result[name] = cls
+    return result
+
+class MultiScan(common.AbstractWindowsCommand):
+    """Run several scan commands with a single pass over physical memory"""
+
+    def __init__(self, config, *args, **kwargs):
+        common.AbstractWindowsCommand.__init__(self, config, *args, **kwargs)
+        config.add_option("SCANNERS", default = "psscan,filescan,driverscan,mutantscan,symlinkscan,modscan,thrdscan",
+                          help = "Comma separated list of scan commands to run " \
+                                 "(any of: {0})".format(",".join(sorted(scan_commands().keys()))))
+
+        self.commands = {}
+
+    def get_command(self, name):
+        """Returns the (single) instance of the named scan command.
+
+        Commands are only instantiated once they are selected, so the
+        options they add take their default values.
+        """
+        if name not in self.commands:
+            candidates = scan_commands()
+            if name not in candidates:
+                debug.error("{0} is not a command which supports multiscan".format(name))
+            self.commands[name] = candidates[name](self._config)
+        return self.commands[name]
+
+    def calculate(self):
+        address_space = utils.load_as(self._config, astype = 'physical')
+        kernel_as = utils.load_as(self._config)
+
+        owners = {}
+        for name in self._config.SCANNERS.split(","):
+            name = name.strip().lower()
+            command = self.get_command(name)
+            if not command.is_valid_profile(address_space.profile):
+                debug.error("{0} does not support the selected profile.".format(name))
+            owners[command.scanner_class()] = name
+
+        for scanner, offset in scan.MultiScanner(owners.keys()).scan(address_space):
+            name = owners[scanner]
+            result = self.get_command(name).parse_hit(offset, address_space, kernel_as)
+            if result is not None:
+                yield name, result
+
+    def render_text(self, outfd, data):
+        results = {}
+        for name, result in data:
+            results.setdefault(name, []).append(result)
+
+        for name in self._config.SCANNERS.split(","):
+            name = name.strip().lower()
+            outfd.write("{0}\n{1}\n".format(name, "=" * len(name)))
+            self.get_command(name).render_text(outfd, results.get(name, []))
+            outfd.write("\n")
@@ -756,8 +756,9 @@ class task_struct(obj.CType):
         directory_table_base = self.obj_vm.vtop(self.mm.pgd.v())
 
         try:
-            process_as = self.obj_vm.__class__(
-                self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
+            vm = obj.unwrap_vm(self.obj_vm)
+            process_as = vm.__class__(
+                vm.base, vm.get_config(), dtb = directory_table_base)
 
         except AssertionError, _e:
             return obj.NoneObject("Unable to get process AS")
@@ -50,10 +50,6 @@ class catfishScan(scan.BaseScanner):
         self.checks = [ ("MultiStringFinderCheck", {'needles':needles}) ]
         scan.BaseScanner.__init__(self) 
 
-    def scan(self, address_space, offset = 0, maxlen = None):
-        for offset in scan.BaseScanner.scan(self, address_space, offset, maxlen):
-            yield offset
-
 class VolatilityDTB(obj.VolatilityMagic):
     """A scanner for DTB values."""
 
@@ -334,7 +334,8 @@ class _EPROCESS(obj.CType):
         directory_table_base = self.Pcb.DirectoryTableBase.v()
 
         try:
-            process_as = self.obj_vm.__class__(self.obj_vm.base, self.obj_vm.get_config(), dtb = directory_table_base)
+            vm = obj.unwrap_vm(self.obj_vm)
+            process_as = vm.__class__(vm.base, vm.get_config(), dtb = directory_table_base)
         except AssertionError, _e:
             return obj.NoneObject("Unable to get process AS")
 
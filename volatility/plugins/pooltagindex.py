@@ -0,0 +1,87 @@
+# Volatility
+# Copyright (C) 2007-2013 Volatility Foundation
+#
+# This file is part of Volatility.
+#
+# Volatility is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License Version 2 as
+# published by the Free Software Foundation.  You may not use, modify or
+# distribute this program under any other version of the GNU General
+# Public License.
+#
+# Volatility is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Volatility.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+@license:      GNU General Public License 2.0
+@contact:      awalters@4tphi.net
+@organization: Volatility Foundation
+"""
+
+import volatility.scan as scan
+import volatility.cache as cache
+import volatility.utils as utils
+import volatility.debug as debug
+import volatility.registry as registry
+import volatility.plugins.common as common
+
+def known_pool_tags():
+    """Returns the tags searched for by all the registered PoolScanners"""
+    tags = set()
+    for cls in registry.get_plugin_classes(scan.PoolScanner, showall = True).values():
+        for class_name, args in getattr(cls, "checks", []):
+            if class_name == "PoolTagCheck" and args.get("tag"):
+                tags.add(args["tag"])
+    return tags
+
+class PoolTagIndex(common.AbstractWindowsCommand):
+    """Index the pool tags in physical memory for pool scans with --pool-index"""
+
+    def __init__(self, config, *args, **kwargs):
+        common.AbstractWindowsCommand.__init__(self, config, *args, **kwargs)
+        config.add_option("TAGS", default = None,
+                          help = "Comma separated list of additional tags to index")
+
+    def calculate(self):
+        address_space = utils.load_as(self._config, astype = 'physical')
+
+        if not cache.config.CACHE:
+            debug.warning("Caching is not enabled (--cache), the index will not be saved")
+
+        tags = known_pool_tags()
+        if self._config.TAGS:
+            tags.update([t for t in self._config.TAGS.split(",") if t])
+
+        index = scan.PoolTagIndex(address_space, tags)
+        decoders = [common.CheckPoolSize(address_space),
+                    common.CheckPoolType(address_space),
+                    common.CheckPoolIndex(address_space)]
+        before = max([-d.field_offset for d in decoders])
+
+        for block_offset, data, length, _lead in scan.read_blocks(address_space, overlap = 4):
+            for tag in tags:
+                for i in scan.find_all(data, tag, length):
+                    if i < before:
+                        ## The header starts in the previous block
+                        header = address_space.zread(block_offset + i - before, before + len(tag))
+                        values = [d.decode(header, before) for d in decoders]
+                    else:
+                        values = [d.decode(data, i) for d in decoders]
+                    index.add(tag, block_offset + i, values)
+
+        index.save(address_space)
+
+        return index
+
+    def render_text(self, outfd, data):
+        self.table_header(outfd, [("Tag", "16"),
+                                  ("Hits", ">10")])
+
+        for tag in sorted(data.tags.keys()):
+            self.table_row(outfd, tag.encode("string_escape"), len(data.tags[tag][0]))
@@ -21,6 +21,7 @@
 
 import os
 import volatility.obj as obj
+import volatility.debug as debug
 import volatility.utils as utils
 import volatility.addrspace as addrspace
 import volatility.plugins.imagecopy as imagecopy
@@ -30,12 +31,16 @@ class Raw2dmp(imagecopy.ImageCopy):
 
     def calculate(self):
 
+        if self._config.COMPRESS:
+            debug.error("Crash dumps cannot be written as compressed images")
+
         blocksize = self._config.BLOCKSIZE
         self._config.WRITE = True
         pspace = utils.load_as(self._config, astype = 'physical')
         vspace = utils.load_as(self._config)
 
         memory_model = pspace.profile.metadata.get('memory_model', '32bit')
+        self.memory_model = memory_model
 
         if memory_model == "64bit":
             header_format = '_DMP_HEADER64'
@@ -133,6 +138,10 @@ class Raw2dmp(imagecopy.ImageCopy):
             for i in range(s, s + l, blocksize):
                 yield i + headerlen, pspace.read(i, min(blocksize, s + l - i))
 
+    def finish_image(self):
+        """Fixes the CPU context in the crash dump once it is written"""
+        memory_model = self.memory_model
+
         # Reset the config so volatility opens the crash dump 
         self._config.LOCATION = "file://" + self._config.OUTPUT_IMAGE
 
@@ -94,15 +94,20 @@ class SockScan(common.AbstractWindowsCommand):
         return (profile.metadata.get('os', 'unknown') == 'windows' and
                 profile.metadata.get('major', 0) == 5)
 
+    scanner_class = PoolScanSockFast
+
     @cache.CacheDecorator("tests/sockscan")
     def calculate(self):
         ## Just grab the AS and scan it using our scanner
         address_space = utils.load_as(self._config, astype = 'physical')
         if not self.is_valid_profile(address_space.profile):
             debug.error("This command does not support the selected profile.")
-        scanner = PoolScanSockFast()
-        for offset in scanner.scan(address_space):
-            yield obj.Object('_ADDRESS_OBJECT', vm = address_space, offset = offset)
+        for offset in self.scanner_class().scan(address_space):
+            yield self.parse_hit(offset, address_space, None)
+
+    def parse_hit(self, offset, address_space, kernel_as): #pylint: disable-msg=W0613
+        """Returns the _ADDRESS_OBJECT for a scanner hit"""
+        return obj.Object('_ADDRESS_OBJECT', vm = address_space, offset = offset)
 
     def render_text(self, outfd, data):
 
@@ -139,6 +139,8 @@ class PSList(DllList):
                           )
 
         for task in data:
+            # Most of the fields below come from the _EPROCESS itself
+            task = task.snapshot()
             # PHYSICAL_OFFSET must STRICTLY only be used in the results.  If it's used for anything else,
             # it needs to have cache_invalidator set to True in the options
             if not self._config.PHYSICAL_OFFSET:
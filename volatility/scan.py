@@ -33,11 +33,201 @@
 @contact:      awalters@4tphi.net
 @organization: Volatility Foundation
 """
+import os
+import re
+import time
+import bisect
+import array
+import cPickle as pickle
+import multiprocessing
 import volatility.debug as debug
 import volatility.registry as registry
 import volatility.addrspace as addrspace
 import volatility.constants as constants
 import volatility.conf as conf
+import volatility.cache as cache
+
+config = conf.ConfObject()
+
+config.add_option("SCAN-WORKERS", default = 1, type = 'int',
+                  cache_invalidator = False,
+                  help = "Number of processes to use when scanning")
+
+config.add_option("RESUME", default = False, action = 'store_true',
+                  cache_invalidator = False,
+                  help = "Resume interrupted scans from their last checkpoint (needs --cache)")
+
+config.add_option("POOL-INDEX", default = False, action = 'store_true',
+                  cache_invalidator = False,
+                  help = "Only scan the blocks which hold each pool tag according to the pooltagindex index (needs --cache)")
+
+config.add_option("SCAN-STATS", default = False, action = 'store_true',
+                  cache_invalidator = False,
+                  help = "Report scan progress and statistics")
+
+class ScanStats(object):
+    """ Counters describing the progress of a scan.
+
+    Scanners update these as they go and pass them to their callbacks
+    after each block. The checks dict maps the name of each check to
+    a [calls, rejections, seconds] list, for checks which filter a
+    whole block of candidates at once calls is the number of
+    candidates handed to them. The seconds spent in checks which are
+    run on each candidate are estimated from a sample of the calls.
+    """
+    def __init__(self):
+        self.start_time = time.time()
+        self.bytes_scanned = 0
+        self.blocks = 0
+        self.zero_blocks = 0
+        self.zero_bytes = 0
+        self.unreadable_blocks = 0
+        self.read_seconds = 0.0
+        self.position = None
+        self.candidates = 0
+        self.hits = 0
+        self.checks = {}
+        self.check_names = []
+
+    def add_check(self, name):
+        """ Returns the counters for a new check """
+        unique = name
+        i = 1
+        while unique in self.checks:
+            i += 1
+            unique = "{0}#{1}".format(name, i)
+        self.check_names.append(unique)
+        self.checks[unique] = [0, 0, 0.0]
+        return self.checks[unique]
+
+    def merge(self, other):
+        """ Adds the counters of another ScanStats (such as those of a
+        worker process) to ours.
+        """
+        for attr in ["bytes_scanned", "blocks", "zero_blocks", "zero_bytes", "unreadable_blocks",
+                     "read_seconds", "candidates", "hits"]:
+            setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+
+        for name in other.check_names:
+            if name not in self.checks:
+                self.check_names.append(name)
+                self.checks[name] = [0, 0, 0.0]
+            for i, value in enumerate(other.checks[name]):
+                self.checks[name][i] += value
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    @property
+    def rate(self):
+        """ Bytes scanned per second """
+        return self.bytes_scanned / max(self.elapsed, 1e-6)
+
+    @property
+    def check_seconds(self):
+        return sum([c[2] for c in self.checks.values()])
+
+    def summary(self):
+        """ Returns the statistics as a list of lines """
+        lines = ["Scanned {0:#x} bytes in {1} blocks in {2:.2f}s ({3:.2f} MB/s)".format(
+                 self.bytes_scanned, self.blocks, self.elapsed, self.rate / (1024 * 1024)),
+                 "Skipped {0} zero blocks ({1:#x} zero bytes), {2} blocks were not fully readable".format(
+                 self.zero_blocks, self.zero_bytes, self.unreadable_blocks),
+                 "Read {0:.2f}s, checks {1:.2f}s".format(self.read_seconds, self.check_seconds),
+                 "Candidates {0}, hits {1}".format(self.candidates, self.hits)]
+
+        for name in self.check_names:
+            calls, rejections, seconds = self.checks[name]
+            lines.append("  {0}: {1} checked, {2} rejected, {3:.2f}s".format(name, calls, rejections, seconds))
+
+        return lines
+
+class ScanCheckpoint(object):
+    """ A scan callback which saves the progress of a scan (the end
+    of the last block scanned and the hits up to there) in the cache,
+    at most every interval seconds and once the scan is finished.
+
+    Checkpoints are only used again for a scan by the same scanner
+    (with the same checks) of the same range of the same address space:
+    the same stack of address spaces with the same DTB, on top of the
+    same location.
+    """
+    def __init__(self, scanner, address_space, offset, maxlen, interval = 60):
+        self.path = "scanners/checkpoint/{0}".format(scanner.__class__.__name__)
+        stack = []
+        space = address_space
+        while space is not None:
+            stack.append(space.__class__.__name__)
+            space = getattr(space, "base", None)
+        self.key = dict(checks = repr(scanner.checks), space = stack,
+                        dtb = getattr(address_space, "dtb", None),
+                        location = address_space.get_config().LOCATION,
+                        offset = offset, maxlen = maxlen)
+        self.interval = interval
+        self.last = time.time()
+        self.position = None
+        self.hits = []
+        self.finished = False
+
+    def load(self):
+        """ Loads the last checkpoint, returns True if there was one """
+        node = cache.CACHE[self.path]
+        payload = node and node.get_payload()
+        if not payload or payload["key"] != self.key:
+            return False
+
+        self.position = payload["position"]
+        self.hits = payload["hits"]
+        self.finished = payload["finished"]
+        return True
+
+    def save(self):
+        node = cache.CACHE[self.path]
+        if node is None:
+            return
+        node.set_payload(dict(key = self.key, position = self.position,
+                              hits = self.hits, finished = self.finished))
+        node.dump()
+
+    def __call__(self, _scanner, stats, finished = False):
+        if stats.position is not None:
+            self.position = stats.position
+
+        if finished:
+            self.finished = True
+        elif time.time() - self.last < self.interval:
+            return
+
+        self.last = time.time()
+        self.save()
+
+    def interrupted(self):
+        """ Saves the progress of a scan which was stopped part way
+        through a block, dropping the hits found in that block.
+        """
+        if self.finished or self.position is None:
+            return
+        self.hits = [ h for h in self.hits if h < self.position ]
+        self.save()
+
+class StatsReporter(object):
+    """ A scan callback which logs the progress of a scan (at most
+    every interval seconds) and its statistics once it is finished.
+    """
+    def __init__(self, interval = 10):
+        self.interval = interval
+        self.last = time.time()
+
+    def __call__(self, scanner, stats, finished = False):
+        name = scanner.__class__.__name__
+        if finished:
+            for line in stats.summary():
+                debug.info("{0}: {1}".format(name, line))
+        elif time.time() - self.last >= self.interval:
+            self.last = time.time()
+            debug.info("{0}: scanned {1:#x} bytes ({2:.2f} MB/s), {3} hits".format(
+                       name, stats.bytes_scanned, stats.rate / (1024 * 1024), stats.hits))
 
 ########### Following is the new implementation of the scanning
 ########### framework. The old framework was based on PyFlag's
@@ -46,13 +236,39 @@ import volatility.conf as conf
 class BaseScanner(object):
     """ A more thorough scanner which checks every byte """
     checks = []
+
+    ## Whether runs of zero pages can be skipped. This assumes a check
+    ## can not match at an offset which is followed by a whole page of
+    ## zeros. Scanners which look for zeros should disable it.
+    skip_zero_pages = True
+
     def __init__(self, window_size = 8):
         self.buffer = addrspace.BufferAddressSpace(conf.DummyConfig(), data = '\x00' * 1024)
         self.window_size = window_size
         self.constraints = []
+        self.skippers = []
+        self.prefilter = None
+        self.batch_constraints = []
+        self.offset_constraints = []
+        self.check_stats = {}
+        self.checks_run = 0
+        self.stats = ScanStats()
+        self.callbacks = []
 
         self.error_count = 0
 
+    def add_callback(self, callback):
+        """ Registers a function to be called with the progress of
+        each scan as callback(scanner, stats, finished). It is called
+        with finished = False after each block and once more with
+        finished = True at the end of the scan.
+        """
+        self.callbacks.append(callback)
+
+    def report(self, finished = False):
+        for callback in self.callbacks:
+            callback(self, self.stats, finished)
+
     def check_addr(self, found):
         """ This calls all our constraints on the offset found and
         returns the number of contraints that matched.
@@ -79,10 +295,25 @@ class BaseScanner(object):
         return True
 
     overlap = 20
-    def scan(self, address_space, offset = 0, maxlen = None):
-        self.buffer.profile = address_space.profile
-        current_offset = offset
 
+    ## How many bytes in front of an offset the checks read. Every
+    ## block is read with this much of the previous block in front of
+    ## it, so hits just after a block boundary can be checked too.
+    ## build_constraints sets it from the checks.
+    lookbehind = 0
+
+    def object_offset(self, found, address_space): #pylint: disable-msg=W0613
+        """ Returns the offset to report for a hit found at the given
+        offset. BaseScanner reports hits as they are found, scanners
+        such as the PoolScanner override this to locate their object.
+
+        This is the only place to adjust hits: scan and MultiScanner
+        both pass every hit through it.
+        """
+        return found
+
+    def build_constraints(self):
+        """ Instantiates the ScannerChecks specified in self.checks """
         ## Build our constraints from the specified ScannerCheck
         ## classes:
         self.constraints = []
@@ -90,57 +321,711 @@ class BaseScanner(object):
             check = registry.get_plugin_classes(ScannerCheck)[class_name](self.buffer, **args)
             self.constraints.append(check)
 
+        self.lookbehind = max([ c.lookbehind for c in self.constraints ] + [0])
+
         ## Which checks also have skippers?
-        skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
-
-        for (range_start, range_size) in sorted(address_space.get_available_addresses()):
-            # Jump to the next available point to scan from
-            # self.base_offset jumps up to be at least range_start
-            current_offset = max(range_start, current_offset)
-            range_end = range_start + range_size
-
-            # If we have a maximum length, we make sure it's less than the range_end
-            if maxlen:
-                range_end = min(range_end, offset + maxlen)
-
-            while (current_offset < range_end):
-                # We've now got range_start <= self.base_offset < range_end
-
-                # Figure out how much data to read
-                l = min(constants.SCAN_BLOCKSIZE + self.overlap, range_end - current_offset)
-
-                # Populate the buffer with data
-                # We use zread to scan what we can because there are often invalid
-                # pages in the DTB
-                data = address_space.zread(current_offset, l)
-                self.buffer.assign_buffer(data, current_offset)
-
-                ## Run checks throughout this block of data
-                i = 0
-                while i < l:
-                    if self.check_addr(i + current_offset):
-                        ## yield the offset to the start of the memory
-                        ## (after the pool tag)
-                        yield i + current_offset
-
-                    ## Where should we go next? By default we go 1 byte
-                    ## ahead, but if some of the checkers have skippers,
-                    ## we may actually go much farther. Checkers with
-                    ## skippers basically tell us that there is no way
-                    ## they can match anything before the skipped result,
-                    ## so there is no point in trying them on all the data
-                    ## in between. This optimization is useful to really
-                    ## speed things up. FIXME - currently skippers assume
-                    ## that the check must match, therefore we can skip
-                    ## the unmatchable region, but its possible that a
-                    ## scanner needs to match only some checkers.
+        self.skippers = [ c for c in self.constraints if hasattr(c, "skip") ]
+
+        ## Checks which can validate all the candidates of a block at
+        ## once are run first. As with prefilters, this is only valid
+        ## if every check must match.
+        self.batch_constraints = []
+        self.offset_constraints = list(self.constraints)
+        if not self.error_count:
+            self.batch_constraints = [ c for c in self.constraints if hasattr(c, "filter_candidates") ]
+            self.offset_constraints = [ c for c in self.constraints if not hasattr(c, "filter_candidates") ]
+
+        ## [calls, rejections, seconds] for each check
+        self.stats = ScanStats()
+        self.check_stats = {}
+        for check in self.batch_constraints + self.offset_constraints:
+            self.check_stats[check] = self.stats.add_check(check.__class__.__name__)
+        self.checks_run = 0
+
+        if config.SCAN_STATS and not [c for c in self.callbacks if isinstance(c, StatsReporter)]:
+            self.add_callback(StatsReporter())
+        self.load_constraint_order()
+
+        self.prefilter = self.build_prefilter()
+
+    ## How often (in candidates) the per-offset checks are reordered
+    reorder_interval = 256
+
+    ## The per-offset checks are only timed on every timing_interval'th
+    ## candidate, timing every call costs about as much as cheap checks
+    timing_interval = 16
+
+    def reorder_constraints(self):
+        """ Orders the per-offset checks so that the cheapest and most
+        selective run first.
+
+        Whether a candidate passes does not depend on the order of
+        stateless checks, only the time spent rejecting it does. Checks
+        are sorted by their average cost divided by their rejection
+        rate. Checks which have not been timed yet (because earlier ones
+        rejected the sampled candidates) are tried first so they get
+        measured. Checks which are not stateless keep their place, only
+        the checks between them are sorted.
+        """
+        def rank(check):
+            calls, rejections, seconds = self.check_stats[check]
+            if not calls:
+                return 0
+            return (seconds / calls) / max(float(rejections) / calls, 1e-6)
+
+        ordered = []
+        run = []
+        for check in self.offset_constraints:
+            if check.stateless:
+                run.append(check)
+            else:
+                ordered.extend(sorted(run, key = rank))
+                ordered.append(check)
+                run = []
+        ordered.extend(sorted(run, key = rank))
+        self.offset_constraints = ordered
+
+    def constraint_order_path(self):
+        return "scanners/constraint_order/{0}".format(self.__class__.__name__)
+
+    def load_constraint_order(self):
+        """ Applies the check order learnt by a previous scan (when
+        caching is enabled).
+        """
+        node = cache.CACHE[self.constraint_order_path()]
+        order = node and node.get_payload()
+        if not order:
+            return
+
+        names = [ c.__class__.__name__ for c in self.offset_constraints ]
+        if sorted(order) != sorted(names):
+            return
+
+        ## Checks of the same class keep their relative order
+        remaining = list(self.offset_constraints)
+        ordered = []
+        for name in order:
+            check = [ c for c in remaining if c.__class__.__name__ == name ][0]
+            remaining.remove(check)
+            ordered.append(check)
+
+        ## Checks which are not stateless must keep their place
+        stateful = lambda checks: [ (i, c) for i, c in enumerate(checks) if not c.stateless ]
+        if stateful(ordered) != stateful(self.offset_constraints):
+            return
+        self.offset_constraints = ordered
+
+    def save_constraint_order(self):
+        """ Stores the learnt check order in the cache """
+        if not self.checks_run:
+            return
+        node = cache.CACHE[self.constraint_order_path()]
+        if node is None:
+            return
+        node.set_payload([ c.__class__.__name__ for c in self.offset_constraints ])
+        node.dump()
+
+    def build_prefilter(self):
+        """ Returns the prefilter used to locate candidate offsets.
+
+        The first check which provides a prefilter is used. Prefilters
+        are only valid if every check must match, so scanners which
+        tolerate errors fall back to walking the data (using the
+        skippers, if any).
+
+        The result is None, a literal string, a tuple of literal
+        strings or a compiled regular expression whose matches start at
+        the candidate offsets.
+        """
+        if self.error_count:
+            return None
+
+        for check in self.constraints:
+            if not hasattr(check, "prefilter"):
+                continue
+
+            prefilter = check.prefilter()
+            if prefilter is None:
+                continue
+
+            if isinstance(prefilter, str):
+                return prefilter
+
+            if not hasattr(prefilter, "finditer"):
+                ## Several literals, any of which may match
+                needles = tuple(set(prefilter))
+                if len(needles) == 1:
+                    return needles[0]
+                return needles
+
+            ## Wrap the expression in a lookahead so overlapping
+            ## matches are all reported
+            return re.compile("(?=" + prefilter.pattern + ")", prefilter.flags)
+
+        if not self.skippers:
+            debug.debug("{0} has no prefilter or skipper, checking every byte".format(self.__class__.__name__))
+
+        return None
+
+    def zero_pages_skipped(self):
+        """ Zero pages can be skipped unless the scanner looks for zeros
+        (or a literal prefilter could match in them).
+        """
+        if not self.skip_zero_pages:
+            return False
+        if isinstance(self.prefilter, str):
+            return bool(self.prefilter.strip("\x00"))
+        if isinstance(self.prefilter, tuple):
+            return all([p.strip("\x00") for p in self.prefilter])
+        return True
+
+    def candidate_windows(self, data, length, lead = 0):
+        """ Returns the (start, end) windows of data[lead:lead + length]
+        which may contain candidates, leaving out the runs of zero pages.
+        """
+        if not self.zero_pages_skipped():
+            return [(lead, lead + length)]
+
+        windows = []
+        skipped = length
+        for start, end in data_runs(data):
+            start = max(start - ZERO_RUN, lead)
+            end = min(end, lead + length)
+            if start < end:
+                windows.append((start, end))
+                skipped -= end - start
+
+        self.stats.zero_bytes += skipped
+        return windows
+
+    def candidates(self, data, length, lead = 0):
+        """ Yields the offsets within data (from lead and less than
+        lead + length) at which the constraints should be checked.
+
+        Literal prefilters are found by str.find, which skips runs of
+        zeros quickly anyway. Otherwise the runs of zero pages are left
+        out of the walk.
+        """
+        prefilter = self.prefilter
+
+        if prefilter is None:
+            ## Walk through the data. By default we go 1 byte ahead,
+            ## but if some of the checkers have skippers, we may
+            ## actually go much farther. Checkers with skippers
+            ## basically tell us that there is no way they can match
+            ## anything before the skipped result, so there is no
+            ## point in trying them on all the data in between. FIXME
+            ## - currently skippers assume that the check must match,
+            ## therefore we can skip the unmatchable region, but its
+            ## possible that a scanner needs to match only some
+            ## checkers.
+            i = lead
+            for start, end in self.candidate_windows(data, length, lead):
+                i = max(i, start)
+                while i < end:
+                    yield i
+
                     skip = 1
-                    for s in skippers:
+                    for s in self.skippers:
                         skip = max(skip, s.skip(data, i))
 
                     i += skip
 
-                current_offset += min(constants.SCAN_BLOCKSIZE, l)
+        elif isinstance(prefilter, str):
+            ## A literal is found fastest with str.find
+            for i in find_all(data, prefilter, lead + length, lead):
+                yield i
+
+        elif isinstance(prefilter, tuple):
+            ## So are several literals, even though each needs a pass
+            hits = set()
+            for needle in prefilter:
+                hits.update(find_all(data, needle, lead + length, lead))
+            for i in sorted(hits):
+                yield i
+
+        else:
+            windows = self.candidate_windows(data, length, lead)
+            for n, (start, end) in enumerate(windows):
+                ## Matches may read a little past the window
+                if n + 1 < len(windows):
+                    endpos = windows[n + 1][0] + ZERO_RUN
+                else:
+                    endpos = len(data)
+
+                for match in prefilter.finditer(data, start, endpos):
+                    i = match.start()
+                    if i >= end:
+                        break
+                    yield i
+
+    def scan_block(self, data, block_offset, length, lead = 0):
+        """ Runs the constraints over a block of data, yielding the
+        offsets of all hits which start within the length bytes of the
+        block at block_offset. The data was read from block_offset -
+        lead: the lead bytes in front of the block and any data past
+        its end (the overlap with the next block) are only used by
+        checks which need to read beyond the block boundaries.
+
+        The (relatively slow) constraints are only run at the
+        candidate offsets found by the prefilter, after the checks which
+        can filter a whole batch of candidates have removed the ones
+        they reject.
+        """
+        data_offset = block_offset - lead
+        self.buffer.assign_buffer(data, data_offset)
+        stats = self.stats
+        stats.blocks += 1
+        stats.bytes_scanned += length
+
+        if self.zero_pages_skipped() and not any(data_runs(data)):
+            stats.zero_blocks += 1
+            stats.zero_bytes += length
+            return
+
+        candidates = self.candidates(data, length, lead)
+        if self.batch_constraints:
+            candidates = list(candidates)
+            stats.candidates += len(candidates)
+            for check in self.batch_constraints:
+                if not candidates:
+                    return
+                check_stats = self.check_stats[check]
+                start = time.time()
+                count = len(candidates)
+                candidates = check.filter_candidates(data, data_offset, candidates)
+                check_stats[0] += count
+                check_stats[1] += count - len(candidates)
+                check_stats[2] += time.time() - start
+        else:
+            candidates = counted(candidates, stats)
+
+        for i in candidates:
+            if self.check_offset(i + data_offset):
+                stats.hits += 1
+                ## yield the offset to the start of the memory
+                ## (after the pool tag)
+                yield i + data_offset
+
+    def check_offset(self, found):
+        """ Like check_addr, but only runs the constraints which were
+        not already applied to the whole block.
+        """
+        self.checks_run += 1
+        if self.checks_run % self.reorder_interval == 0:
+            self.reorder_constraints()
+
+        timed = self.checks_run % self.timing_interval == 0
+
+        cnt = 0
+        result = True
+        for check in self.offset_constraints:
+            stats = self.check_stats[check]
+            if timed:
+                start = time.time()
+
+            ## constraints can raise for an error
+            try:
+                val = check.check(found)
+            except Exception:
+                debug.b()
+                val = False
+
+            stats[0] += 1
+            if timed:
+                stats[2] += (time.time() - start) * self.timing_interval
+
+            if not val:
+                stats[1] += 1
+                cnt = cnt + 1
+
+            if cnt > self.error_count:
+                result = False
+                break
+
+        return result
+
+    def scan_range(self, address_space, start, end, limit):
+        """ Scans the blocks starting in [start, end), reading no
+        further than limit (the end of the available range).
+        """
+        for block_offset, data, length, lead in read_range(address_space, start, end, limit, self.overlap,
+                                                           self.stats, self.lookbehind):
+            for hit in self.scan_block(data, block_offset, length, lead):
+                yield hit
+            self.stats.position = block_offset + length
+            self.report()
+
+    def scan(self, address_space, offset = 0, maxlen = None):
+        for hit in self.scan_hits(address_space, offset, maxlen):
+            yield self.object_offset(hit, address_space)
+
+    def scan_hits(self, address_space, offset = 0, maxlen = None):
+        """ Yields the offsets at which the checks matched, before
+        they are passed through object_offset.
+        """
+        self.buffer.profile = address_space.profile
+        self.build_constraints()
+
+        ranges = list(scan_ranges(address_space, offset, maxlen))
+
+        ## With --resume (and caching enabled) scans are checkpointed,
+        ## and resumed from the last checkpoint
+        checkpoint = None
+        if config.RESUME:
+            if not cache.config.CACHE:
+                debug.warning("Caching is not enabled (--cache), scans can not be resumed")
+            else:
+                checkpoint = ScanCheckpoint(self, address_space, offset, maxlen)
+
+        if checkpoint and checkpoint.load():
+            debug.info("Resuming {0} from {1:#x}".format(self.__class__.__name__, checkpoint.position or offset))
+            for hit in list(checkpoint.hits):
+                yield hit
+            if checkpoint.finished:
+                return
+            if checkpoint.position is not None:
+                ranges = [(max(start, checkpoint.position), end)
+                          for start, end in ranges if end > checkpoint.position]
+
+        if not checkpoint:
+            for hit in self.scan_range_list(address_space, ranges):
+                yield hit
+            return
+
+        self.add_callback(checkpoint)
+        try:
+            for hit in self.scan_range_list(address_space, ranges):
+                checkpoint.hits.append(hit)
+                yield hit
+        finally:
+            self.callbacks.remove(checkpoint)
+            checkpoint.interrupted()
+
+    def scan_range_list(self, address_space, ranges):
+        """ Scans the given (start, end) ranges of an address space """
+        workers = config.SCAN_WORKERS or 1
+        if workers > 1 and self.parallel_allowed(ranges):
+            for hit in self.parallel_scan(address_space, ranges, workers):
+                yield hit
+        else:
+            for start, end in ranges:
+                for hit in self.scan_range(address_space, start, end, end):
+                    yield hit
+
+            self.save_constraint_order()
+
+        self.report(finished = True)
+
+    ## Scans of fewer blocks than this are not worth starting workers for
+    parallel_min_blocks = 4
+
+    def parallel_allowed(self, ranges):
+        """ Returns whether the ranges can be scanned by worker
+        processes. They can not when a check keeps state (which would
+        stay in the workers), nor are small scans worth it.
+        """
+        stateful = [ c for c in self.constraints if not c.stateless ]
+        if stateful:
+            debug.debug("{0} has stateful checks ({1}), scanning sequentially".format(
+                        self.__class__.__name__, ", ".join([c.__class__.__name__ for c in stateful])))
+            return False
+
+        size = sum([end - start for start, end in ranges])
+        return size >= self.parallel_min_blocks * constants.SCAN_BLOCKSIZE and hasattr(os, "fork")
+
+    def parallel_scan(self, address_space, ranges, workers):
+        """ Scans using a pool of worker processes.
+
+        The ranges are cut into chunks on the same block boundaries
+        that a sequential scan uses, and each chunk may read past its
+        end (up to the end of the range) for the overlap, so the hits
+        are exactly those of a sequential scan. The results are
+        yielded in address order.
+
+        The workers are forked with this scanner (its constraints
+        often hold lambdas, which can not be pickled) and each opens
+        its own copy of the address space from its pickled state, so
+        they do not share file handles. If the workers fail to open
+        it, the rest of the scan is done sequentially.
+        """
+        global _worker_scanner
+
+        chunks = []
+        for start, end in ranges:
+            for chunk_start in range(start, end, constants.SCAN_BLOCKSIZE):
+                chunks.append((chunk_start, min(chunk_start + constants.SCAN_BLOCKSIZE, end), end))
+
+        try:
+            state = pickle.dumps(address_space, pickle.HIGHEST_PROTOCOL)
+        except Exception, e:
+            debug.warning("Unable to pickle {0} ({1}), scanning sequentially".format(
+                          address_space.__class__.__name__, e))
+            state = None
+
+        done = 0
+        if state is not None:
+            _worker_scanner = self
+            pool = multiprocessing.Pool(workers, _init_worker, (state,))
+            try:
+                for hits, stats in pool.imap(_scan_chunk, chunks):
+                    self.stats.merge(stats)
+                    for hit in hits:
+                        yield hit
+                    self.stats.position = chunks[done][1]
+                    done += 1
+                    self.report()
+                pool.close()
+            except WorkerError, e:
+                debug.warning("{0}, scanning sequentially".format(e))
+            finally:
+                _worker_scanner = None
+                pool.terminate()
+                pool.join()
+
+        for start, end, limit in chunks[done:]:
+            for hit in self.scan_range(address_space, start, end, limit):
+                yield hit
+
+class WorkerError(Exception):
+    """ Raised by a parallel scan worker which could not open the
+    address space it was handed.
+    """
+
+## The scanner and address space used by each parallel scan worker
+_worker_scanner = None
+_worker_space = None
+_worker_error = None
+
+def _init_worker(state):
+    global _worker_space, _worker_error
+    ## An exception here would make the pool start new workers forever,
+    ## so it is reported by the first chunk instead
+    try:
+        _worker_space = pickle.loads(state)
+    except Exception, e:
+        _worker_error = e
+
+def _scan_chunk(chunk):
+    start, end, limit = chunk
+    if _worker_space is None:
+        raise WorkerError("Unable to open the address space in a worker ({0})".format(_worker_error))
+
+    ## Only count this chunk, the parent adds it to its own totals
+    ## and reports the progress
+    stats = _worker_scanner.stats = ScanStats()
+    for check in _worker_scanner.batch_constraints + _worker_scanner.offset_constraints:
+        _worker_scanner.check_stats[check] = stats.add_check(check.__class__.__name__)
+    _worker_scanner.callbacks = []
+
+    hits = list(_worker_scanner.scan_range(_worker_space, start, end, limit))
+    return hits, stats
+
+def counted(candidates, stats):
+    """ Passes candidates through, counting them in stats """
+    for i in candidates:
+        stats.candidates += 1
+        yield i
+
+## The size of the zero runs which are skipped
+ZERO_RUN = 0x1000
+ZERO_PAGE = "\x00" * ZERO_RUN
+
+def data_runs(data, length = None):
+    """ Yields the (start, end) runs of data which are left once the
+    pages (ZERO_RUN bytes, counted from the start of data) which only
+    hold zeros are taken out. These are zero filled pages as well as
+    those zread padded because they were not available.
+
+    Comparing a page with str.startswith does not copy it and stops at
+    the first byte that differs, so this costs little compared to
+    scanning the data.
+    """
+    if length is None:
+        length = len(data)
+
+    start = None
+    for page in xrange(0, length, ZERO_RUN):
+        if page + ZERO_RUN > length:
+            zero = not data[page:length].strip("\x00")
+        else:
+            zero = data.startswith(ZERO_PAGE, page)
+
+        if zero:
+            if start is not None:
+                yield start, page
+                start = None
+        elif start is None:
+            start = page
+
+    if start is not None:
+        yield start, length
+
+def unreadable_pages(address_space, offset, data, start = 0):
+    """ Returns whether some of data (from start on), which was zread
+    from offset, was padded because it is not available. Only the
+    pages which read as zeros are looked up.
+    """
+    for page in xrange(start, len(data), ZERO_RUN):
+        if page + ZERO_RUN > len(data):
+            zero = not data[page:].strip("\x00")
+        else:
+            zero = data.startswith(ZERO_PAGE, page)
+
+        if zero and not address_space.is_valid_address(offset + page):
+            return True
+
+    return False
+
+def find_all(data, needle, length, start = 0):
+    """ Yields the offsets of all (possibly overlapping) occurrences
+    of needle which start from start and within the first length bytes
+    of data.
+    """
+    end = length + len(needle) - 1
+    i = data.find(needle, start, end)
+    while i >= 0:
+        yield i
+        i = data.find(needle, i + 1, end)
+
+def scan_ranges(address_space, offset = 0, maxlen = None):
+    """ Yields the (start, end) ranges of an address space which a
+    scan from offset (of at most maxlen bytes) should cover.
+    """
+    current_offset = offset
+
+    for (range_start, range_size) in sorted(address_space.get_available_addresses()):
+        # Jump to the next available point to scan from
+        # self.base_offset jumps up to be at least range_start
+        current_offset = max(range_start, current_offset)
+        range_end = range_start + range_size
+
+        # If we have a maximum length, we make sure it's less than the range_end
+        if maxlen:
+            range_end = min(range_end, offset + maxlen)
+
+        if current_offset < range_end:
+            yield current_offset, range_end
+
+        current_offset = max(current_offset, range_end)
+
+def read_range(address_space, start, end, limit, overlap = 0, stats = None, lookbehind = 0):
+    """ A generator which reads the blocks starting in [start, end)
+    in SCAN_BLOCKSIZE steps, never reading past limit.
+
+    Yields (block_offset, data, length, lead) tuples. The data was read
+    from block_offset - lead: each block carries the lookbehind bytes
+    in front of it and up to overlap bytes of the following block so
+    that matches which straddle a block boundary can be checked, but
+    only hits within the length bytes from block_offset belong to the
+    block - the other bytes are scanned as part of their own block.
+
+    If a ScanStats is given the time spent reading is added to it.
+    """
+    current_offset = start
+
+    while (current_offset < end):
+        # Figure out how much data to read
+        l = min(constants.SCAN_BLOCKSIZE + overlap, limit - current_offset)
+        lead = min(lookbehind, current_offset)
+
+        # Populate the buffer with data
+        # We use zread to scan what we can because there are often invalid
+        # pages in the DTB
+        if stats:
+            read_start = time.time()
+            data = address_space.zread(current_offset - lead, l + lead)
+            stats.read_seconds += time.time() - read_start
+
+            ## The count is only reported with --scan-stats
+            if config.SCAN_STATS and unreadable_pages(address_space, current_offset - lead, data, lead):
+                stats.unreadable_blocks += 1
+        else:
+            data = address_space.zread(current_offset - lead, l + lead)
+
+        length = min(constants.SCAN_BLOCKSIZE, l)
+        yield current_offset, data, length, lead
+
+        current_offset += length
+
+def read_blocks(address_space, offset = 0, maxlen = None, overlap = 0, stats = None, lookbehind = 0):
+    """ Reads the available ranges of an address space in blocks, see
+    read_range.
+    """
+    for start, end in scan_ranges(address_space, offset, maxlen):
+        for block in read_range(address_space, start, end, end, overlap, stats, lookbehind):
+            yield block
+
+class MultiScanner(object):
+    """ Runs several scanners over an address space in a single pass.
+
+    Each block of the address space is read once and handed to every
+    scanner in turn, so scanning for N different objects costs the
+    same I/O as scanning for one. Hits are yielded as (scanner, offset)
+    tuples, where offset has been passed through the scanner's
+    object_offset (so scanners report the same offsets as their own
+    scan method would). Scanners which override scan itself can not
+    take part, as the MultiScanner would skip whatever they do there.
+
+    Hits are yielded block by block, within a block they are grouped
+    by scanner.
+
+    Each scanner keeps its own statistics and callbacks, the time
+    spent reading is recorded in the MultiScanner's stats.
+    """
+    def __init__(self, scanners):
+        self.scanners = list(scanners)
+        for scanner in self.scanners:
+            if type(scanner).scan.im_func is not BaseScanner.scan.im_func:
+                raise ValueError("{0} overrides scan, so it can not be run by a MultiScanner".format(
+                        scanner.__class__.__name__))
+        self.overlap = max([s.overlap for s in self.scanners] or [0])
+        self.lookbehind = 0
+        self.stats = ScanStats()
+        self.callbacks = []
+
+    def add_callback(self, callback):
+        """ Registers a callback for the progress of the whole pass,
+        see BaseScanner.add_callback.
+        """
+        self.callbacks.append(callback)
+
+    def report(self, finished = False):
+        for callback in self.callbacks:
+            callback(self, self.stats, finished)
+
+    def scan(self, address_space, offset = 0, maxlen = None):
+        self.stats = ScanStats()
+        for scanner in self.scanners:
+            scanner.buffer.profile = address_space.profile
+            scanner.build_constraints()
+        self.lookbehind = max([s.lookbehind for s in self.scanners] or [0])
+
+        if config.SCAN_STATS and not self.callbacks:
+            self.add_callback(StatsReporter())
+
+        for block_offset, data, length, lead in read_blocks(address_space, offset, maxlen, self.overlap,
+                                                            self.stats, self.lookbehind):
+            self.stats.blocks += 1
+            self.stats.bytes_scanned += length
+
+            for scanner in self.scanners:
+                ## Hand each scanner only the context it asked for
+                scanner_data = data
+                scanner_lead = min(scanner.lookbehind, lead)
+                if scanner.overlap < self.overlap or scanner_lead < lead:
+                    scanner_data = data[lead - scanner_lead:lead + length + scanner.overlap]
+
+                for hit in scanner.scan_block(scanner_data, block_offset, length, scanner_lead):
+                    self.stats.hits += 1
+                    yield scanner, scanner.object_offset(hit, address_space)
+                scanner.report()
+
+            self.report()
+
+        for scanner in self.scanners:
+            scanner.report(finished = True)
+        self.report(finished = True)
 
 class DiscontigScanner(BaseScanner):
     def scan(self, address_space, offset = 0, maxlen = None):
@@ -156,6 +1041,15 @@ class ScannerCheck(object):
 
     This class is the base class for all checks.
     """
+    ## How many bytes in front of the offset check reads
+    lookbehind = 0
+
+    ## Whether check only looks at memory, without keeping any state
+    ## or having other side effects. Checks which keep state (such as
+    ## what they found) need this disabled, so they are not run in
+    ## parallel scan workers nor moved when the checks are reordered.
+    stateless = True
+
     def __init__(self, address_space, **_kwargs):
         self.address_space = address_space
 
@@ -173,6 +1067,15 @@ class ScannerCheck(object):
     #def skip(self, data, offset):
     #    return -1
 
+    ## Better still, define this method if the check can only match
+    ## where some data is present. Return a literal string, a list of
+    ## literal strings or a compiled regular expression that must
+    ## match at the offset of every hit. The scanner searches each
+    ## block for it (at C speed) and only runs the checks on the
+    ## offsets where it matches, so skip is not used at all.
+    #def prefilter(self):
+    #    return "Tag1"
+
 class PoolScanner(BaseScanner):
 
     def object_offset(self, found, address_space):
@@ -217,6 +1120,137 @@ class PoolScanner(BaseScanner):
         ## for the PoolTag.
         return found - self.buffer.profile.get_obj_offset('_POOL_HEADER', 'PoolTag')
 
-    def scan(self, address_space, offset = 0, maxlen = None):
-        for i in BaseScanner.scan(self, address_space, offset, maxlen):
-            yield self.object_offset(i, address_space)
+    def build_constraints(self):
+        BaseScanner.build_constraints(self)
+        ## The checks of pool scanners read the _POOL_HEADER in front
+        ## of the tag
+        self.lookbehind = max(self.lookbehind,
+                              self.buffer.profile.get_obj_offset('_POOL_HEADER', 'PoolTag'))
+
+    def pool_tag(self):
+        """ Returns the tag this scanner searches for (if any) """
+        for class_name, args in self.checks:
+            if class_name == "PoolTagCheck":
+                return args.get("tag")
+        return None
+
+    def scan_index(self, index, address_space, offset = 0, maxlen = None):
+        """ Scans the blocks which hold the tag according to a
+        PoolTagIndex rather than all of memory.
+
+        The pool header checks are first applied to the header fields
+        stored in the index. The blocks holding the remaining tags are
+        then scanned as a full scan would (with the same context on
+        either side), so the hits are those of a full scan.
+        """
+        self.buffer.profile = address_space.profile
+        self.build_constraints()
+
+        header_checks = [ c for c in self.constraints if getattr(c, "field", None) ]
+        block_size = constants.SCAN_BLOCKSIZE
+
+        for start, end in scan_ranges(address_space, offset, maxlen):
+            last_block = None
+            for hit, fields in index.hits(self.pool_tag(), start, end):
+                if [ c for c in header_checks if c.field in fields and not c.test(fields[c.field]) ]:
+                    continue
+
+                ## The start of the block a full scan finds the tag in
+                block = start + (hit - start) / block_size * block_size
+                if block == last_block:
+                    continue
+                last_block = block
+
+                for found in self.scan_range(address_space, block, block + 1, end):
+                    yield found
+
+        self.report(finished = True)
+
+    def scan_hits(self, address_space, offset = 0, maxlen = None):
+        index = None
+        if config.POOL_INDEX and not self.error_count and self.pool_tag():
+            index = PoolTagIndex.load(address_space)
+
+        if index and self.pool_tag() in index.tags:
+            debug.debug("Answering {0} from the pool tag index".format(self.__class__.__name__))
+            return self.scan_index(index, address_space, offset, maxlen)
+        return BaseScanner.scan_hits(self, address_space, offset, maxlen)
+
+class PoolTagIndex(object):
+    """ An index of the pool tags found in an address space.
+
+    For each tag the index holds sorted arrays of the offsets at which
+    the tag was found and the BlockSize, PoolType and PoolIndex fields
+    of the _POOL_HEADER in front of it. The index is stored in the
+    cache (keyed by image and address space), see the pooltagindex
+    command which builds it.
+    """
+    fields = [("BlockSize", "H"), ("PoolType", "B"), ("PoolIndex", "B")]
+
+    ## Python 2 arrays have no 64-bit typecode on every platform, but
+    ## doubles hold physical offsets (below 2**53) exactly
+    offset_code = "L" if array.array("L").itemsize >= 8 else "d"
+
+    def __init__(self, address_space, tags = None):
+        self.space_name = address_space.__class__.__name__
+        self.ranges = list(scan_ranges(address_space))
+        self.tags = {}
+        for tag in tags or []:
+            self.tags[tag] = [array.array(self.offset_code)] + [array.array(code) for _, code in self.fields]
+
+    def add(self, tag, offset, values):
+        """ Records a tag found at offset, values are the header fields """
+        entries = self.tags[tag]
+        entries[0].append(offset)
+        for i in range(len(self.fields)):
+            entries[i + 1].append(values[i])
+
+    def hits(self, tag, start = 0, end = None):
+        """ Yields (offset, fields) for the tag between start and end """
+        entries = self.tags[tag]
+        offsets = entries[0]
+        i = bisect.bisect_left(offsets, start)
+        while i < len(offsets) and (end is None or offsets[i] < end):
+            yield int(offsets[i]), dict([(name, entries[j + 1][i]) for j, (name, _) in enumerate(self.fields)])
+            i += 1
+
+    @staticmethod
+    def cache_path(address_space):
+        return "scanners/pooltagindex/{0}".format(address_space.__class__.__name__)
+
+    def save(self, address_space):
+        """ Stores the index in the cache. Arrays are stored as strings
+        which keeps the pickle compact.
+        """
+        tags = {}
+        for tag, entries in self.tags.items():
+            tags[tag] = [ a.tostring() for a in entries ]
+
+        node = cache.CACHE[self.cache_path(address_space)]
+        if node is None:
+            return
+        node.set_payload(dict(space = self.space_name, ranges = self.ranges, tags = tags))
+        node.dump()
+
+    @classmethod
+    def load(cls, address_space):
+        """ Returns the index for this address space from the cache, or
+        None if there is no (valid) index.
+        """
+        node = cache.CACHE[cls.cache_path(address_space)]
+        payload = node and node.get_payload()
+        if not payload:
+            return None
+
+        index = cls(address_space)
+        if payload["space"] != index.space_name or [tuple(r) for r in payload["ranges"]] != index.ranges:
+            debug.debug("Ignoring pool tag index built for a different address space")
+            return None
+
+        for tag, strings in payload["tags"].items():
+            entries = [array.array(cls.offset_code)] + [array.array(code) for _, code in cls.fields]
+            for a, string in zip(entries, strings):
+                a.fromstring(string)
+            index.tags[tag] = entries
+
+        return index
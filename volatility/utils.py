@@ -29,10 +29,12 @@ import itertools
 
 #pylint: disable-msg=C0111
 
-def load_as(config, astype = 'virtual', **kwargs):
-    """Loads an address space by stacking valid ASes on top of each other (priority order first)"""
+def load_as(config, astype = 'virtual', base_as = None, **kwargs):
+    """Loads an address space by stacking valid ASes on top of each other (priority order first)
+
+    If base_as is given the stacking starts from it, rather than from scratch.
+    """
 
-    base_as = None
     error = exceptions.AddrSpaceError()
 
     # Start off requiring another round    
@@ -32,100 +32,108 @@
 
 #pylint: disable-msg=C0111
 
-from struct import unpack
-from struct import error as StructError
+import struct
 
-def recombine(outbuf):
-    return "".join(outbuf[k] for k in sorted(outbuf.keys()))
+indicator_struct = struct.Struct("<L")
+length_struct = struct.Struct("<H")
 
 def xpress_decode(inputBuffer):
-    outputBuffer = {}
-    outputIndex = 0
+    """Decompresses a buffer of Xpress (LZ77) compressed data.
+
+    The output is built in a bytearray: runs of literals are copied
+    with a single slice and back references with a slice (or a
+    repeated pattern when they overlap the data being written).
+    Truncated or corrupt input returns whatever was decoded up to
+    that point.
+    """
+    source = bytearray(inputBuffer)
+    inputLength = len(source)
+    output = bytearray()
     inputIndex = 0
-    indicatorBit = 0
+    indicator = 0
+    indicatorBits = 0
     nibbleIndex = 0
 
-    # we are decoding the entire input here, so I have changed
-    # the check to see if we're at the end of the output buffer
-    # with a check to see if we still have any input left.
-    while inputIndex < len(inputBuffer):
-        if (indicatorBit == 0):
-            # in pseudocode this was indicatorBit = ..., but that makes no
-            # sense, so I think this was intended...
-            try:
-                indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
-            except StructError:
-                return recombine(outputBuffer)
-
+    while inputIndex < inputLength:
+        if indicatorBits == 0:
+            if inputIndex + 4 > inputLength:
+                break
+            indicator = indicator_struct.unpack_from(source, inputIndex)[0]
             inputIndex += 4
-            indicatorBit = 32
-
-        indicatorBit = indicatorBit - 1
-        # check whether the bit specified by indicatorBit is set or not 
-        # set in indicator. For example, if indicatorBit has value 4 
-        # check whether the 4th bit of the value in indicator is set
-        if not (indicator & (1 << indicatorBit)):
-            try:
-                outputBuffer[outputIndex] = inputBuffer[inputIndex]
-            except IndexError:
-                return recombine(outputBuffer)
-
-            inputIndex += 1
-            outputIndex += 1
+            indicatorBits = 32
+
+        # Bits are used from the most significant end, a clear bit
+        # is a literal byte.  Copy all the consecutive literals at once.
+        remaining = indicator & ((1 << indicatorBits) - 1)
+        literals = indicatorBits - remaining.bit_length()
+        if literals:
+            end = min(inputIndex + literals, inputLength)
+            output += source[inputIndex:end]
+            indicatorBits -= end - inputIndex
+            inputIndex = end
+            continue
+
+        indicatorBits -= 1
+
+        # Get the length. This appears to use a scheme whereby if
+        # the value at the current width is all ones, then we assume
+        # that it is actually wider. First we try 3 bits, then 3
+        # bits plus a nibble, then a byte, and finally two bytes (an
+        # unsigned short). Also, if we are using a nibble, then every
+        # other time we get the nibble from the high part of the previous
+        # byte used as a length nibble.
+        # Thus if a nibble byte is F2, we would first use the low part (2),
+        # and then at some later point get the nibble from the high part (F).
+        if inputIndex + 2 > inputLength:
+            break
+        length = length_struct.unpack_from(source, inputIndex)[0]
+        inputIndex += 2
+        offset = length >> 3
+        length = length & 7
+
+        if length == 7:
+            if nibbleIndex == 0:
+                if inputIndex >= inputLength:
+                    break
+                nibbleIndex = inputIndex
+                length = source[inputIndex] & 0xF
+                inputIndex += 1
+            else:
+                # get the high nibble of the last place a nibble sized
+                # length was used thus we don't waste that extra half
+                # byte :p
+                length = source[nibbleIndex] >> 4
+                nibbleIndex = 0
+
+            if length == 15:
+                if inputIndex >= inputLength:
+                    break
+                length = source[inputIndex]
+                inputIndex += 1
+                if length == 255:
+                    if inputIndex + 2 > inputLength:
+                        break
+                    length = length_struct.unpack_from(source, inputIndex)[0]
+                    inputIndex += 2
+                    length = length - (15 + 7)
+                length = length + 15
+            length = length + 7
+        length = length + 3
+
+        start = len(output) - offset - 1
+        if start < 0:
+            break
+
+        distance = offset + 1
+        if distance >= length:
+            output += output[start:start + length]
         else:
-            # Get the length. This appears to use a scheme whereby if
-            # the value at the current width is all ones, then we assume
-            # that it is actually wider. First we try 3 bits, then 3
-            # bits plus a nibble, then a byte, and finally two bytes (an
-            # unsigned short). Also, if we are using a nibble, then every
-            # other time we get the nibble from the high part of the previous 
-            # byte used as a length nibble.
-            # Thus if a nibble byte is F2, we would first use the low part (2),
-            # and then at some later point get the nibble from the high part (F).
-
-            try:
-                length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-            except StructError:
-                return recombine(outputBuffer)
-
-            inputIndex += 2
-            offset = length / 8
-            length = length % 8
-            if length == 7:
-                if nibbleIndex == 0:
-                    nibbleIndex = inputIndex
-                    length = ord(inputBuffer[inputIndex]) % 16
-                    inputIndex += 1
-                else:
-                    # get the high nibble of the last place a nibble sized
-                    # length was used thus we don't waste that extra half
-                    # byte :p
-                    length = ord(inputBuffer[nibbleIndex]) / 16
-                    nibbleIndex = 0
-
-                if length == 15:
-                    length = ord(inputBuffer[inputIndex])
-                    inputIndex += 1
-                    if length == 255:
-                        try:
-                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-                        except StructError:
-                            return recombine(outputBuffer)
-                        inputIndex = inputIndex + 2
-                        length = length - (15 + 7)
-                    length = length + 15
-                length = length + 7
-            length = length + 3
-
-            while length != 0:
-                try:
-                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
-                except KeyError:
-                    return recombine(outputBuffer)
-                outputIndex += 1
-                length -= 1
-
-    return recombine(outputBuffer)
+            # The reference overlaps the bytes it produces, which
+            # repeats the last distance bytes
+            pattern = output[start:]
+            output += (pattern * (length // distance + 1))[:length]
+
+    return str(output)
 
 try:
     import pyxpress #pylint: disable-msg=F0401